@@ -10,6 +10,9 @@ from queue import Queue
 import time
 
 from .rag_pipeline import rag_pipeline
+from .pdf_processor import pdf_processor
+from .chunking import text_chunker
+from .embeddings import embedding_manager
 
 logger = logging.getLogger(__name__)
 
@@ -123,8 +126,11 @@ class AsyncPaperProcessor:
                 })
                 return
             
-            # Обрабатываем статью
-            result = self.rag_pipeline.process_article(arxiv_id, pdf_url)
+            # Обрабатываем статью (загруженный файл уже лежит на диске)
+            if task.get('uploaded_file'):
+                result = self._process_uploaded_pdf(arxiv_id, pdf_url)
+            else:
+                result = self.rag_pipeline.process_article(arxiv_id, pdf_url)
             
             if result['success']:
                 # Этап 2: Успешное завершение
@@ -140,6 +146,56 @@ class AsyncPaperProcessor:
             logger.error(f"Ошибка при обработке {arxiv_id}: {e}")
             self._error_task(task_id, str(e))
     
+    def _process_uploaded_pdf(self, arxiv_id: str, pdf_path: str) -> Dict:
+        """
+        Извлечение текста, разбиение на чанки и индексация загруженного PDF
+        
+        Args:
+            arxiv_id: ID статьи
+            pdf_path: Путь к загруженному PDF файлу
+            
+        Returns:
+            Результат обработки
+        """
+        extracted_data = pdf_processor.extract_text_pypdf2(pdf_path)
+        
+        if not extracted_data or not extracted_data.get('text'):
+            return {'success': False, 'error': f'Не удалось извлечь текст для RAG обработки: {arxiv_id}'}
+        
+        text_content = extracted_data['text']
+        logger.info(f"Текст извлечен: {len(text_content)} символов")
+        
+        chunk_data = {
+            'text': text_content,
+            'metadata': {
+                'arxiv_id': arxiv_id,
+                'pdf_path': pdf_path,
+                'source': 'uploaded_pdf'
+            }
+        }
+        
+        chunks = text_chunker.chunk_text(chunk_data)
+        
+        if not chunks:
+            return {'success': False, 'error': f'Не удалось создать чанки для {arxiv_id}'}
+        
+        logger.info(f"Создано {len(chunks)} чанков для {arxiv_id}")
+        
+        for chunk in chunks:
+            chunk['metadata']['arxiv_id'] = arxiv_id
+            chunk['metadata']['source'] = 'uploaded_pdf'
+            chunk['metadata']['file_path'] = pdf_path
+        
+        if not embedding_manager.add_to_index(chunks):
+            return {'success': False, 'error': f'Не удалось добавить чанки {arxiv_id} в индекс'}
+        
+        logger.info(f"RAG обработка для {arxiv_id} завершена успешно")
+        return {
+            'success': True,
+            'arxiv_id': arxiv_id,
+            'chunks_count': len(chunks)
+        }
+    
     def _is_article_processed(self, arxiv_id: str) -> bool:
         """
         Проверка, обработана ли уже статья
@@ -151,18 +207,8 @@ class AsyncPaperProcessor:
             True если статья уже в индексе
         """
         try:
-            # Проверяем есть ли чанки этой статьи в индексе
-            stats = self.rag_pipeline.get_index_status()
-            
-            if not stats.get('rag_ready', False):
-                return False
-            
-            # Ищем чанки этой статьи
-            test_results = self.rag_pipeline.query_processor.search_in_article(
-                "test", arxiv_id, k=1
-            )
-            
-            return len(test_results) > 0
+            # Обратный индекс статья -> чанки: без загрузки модели и поиска
+            return bool(self.rag_pipeline.embedding_manager.arxiv_to_chunk_ids.get(arxiv_id))
             
         except Exception as e:
             logger.warning(f"Ошибка проверки статьи {arxiv_id}: {e}")
@@ -271,6 +317,33 @@ class AsyncPaperProcessor:
             arxiv_id: ID статьи arXiv
             pdf_url: URL для скачивания PDF
             
+        Returns:
+            ID задачи для отслеживания
+        """
+        return self._queue_task(arxiv_id, pdf_url)
+    
+    def queue_uploaded_pdf(self, arxiv_id: str, pdf_path: str) -> str:
+        """
+        Постановка загруженного пользователем PDF в очередь на обработку
+        
+        Args:
+            arxiv_id: ID статьи
+            pdf_path: Путь к загруженному PDF файлу
+            
+        Returns:
+            ID задачи для отслеживания
+        """
+        return self._queue_task(arxiv_id, pdf_path, uploaded_file=True)
+    
+    def _queue_task(self, arxiv_id: str, pdf_url: str, uploaded_file: bool = False) -> str:
+        """
+        Создание задачи обработки и добавление ее в очередь
+        
+        Args:
+            arxiv_id: ID статьи
+            pdf_url: URL для скачивания PDF или путь к загруженному файлу
+            uploaded_file: PDF уже загружен пользователем и лежит на диске
+            
         Returns:
             ID задачи для отслеживания
         """
@@ -287,6 +360,7 @@ class AsyncPaperProcessor:
             'task_id': task_id,
             'arxiv_id': arxiv_id,
             'pdf_url': pdf_url,
+            'uploaded_file': uploaded_file,
             'queued_time': time.time()
         }
         
@@ -4,17 +4,35 @@
 
 import os
 import pickle
+import functools
+import threading
 import numpy as np
 from typing import List, Dict, Optional, Tuple
 import logging
 from pathlib import Path
 
 import faiss
-from sentence_transformers import SentenceTransformer
 from rank_bm25 import BM25Okapi
 
 logger = logging.getLogger(__name__)
 
+# Длина краткой выжимки текста чанка
+PREVIEW_LENGTH = 200
+
+def make_preview(text: str) -> str:
+    """
+    Краткая выжимка из текста чанка
+    
+    Args:
+        text: Текст чанка
+        
+    Returns:
+        Первые PREVIEW_LENGTH символов, с многоточием при обрезке
+    """
+    if len(text) > PREVIEW_LENGTH:
+        return text[:PREVIEW_LENGTH] + "..."
+    return text
+
 class EmbeddingManager:
     """
     Класс для управления эмбеддингами и FAISS индексом
@@ -22,15 +40,25 @@ class EmbeddingManager:
     
     def __init__(self, 
                  model_name: str = "paraphrase-multilingual-MiniLM-L12-v2",
-                 embeddings_dir: str = "paper_rag/data/embeddings"):
+                 embeddings_dir: str = "paper_rag/data/embeddings",
+                 quantize_int8: bool = False,
+                 precision: str = "fp32"):
         """
         Инициализация менеджера эмбеддингов
         
         Args:
             model_name: Название модели для эмбеддингов
             embeddings_dir: Директория для сохранения индекса
+            quantize_int8: Хранить векторы в новом индексе в int8 (IndexScalarQuantizer).
+                Индекс в ~4 раза меньше и быстрее при поиске, ценой небольшой потери
+                точности ранжирования; квантизатор обучается на первой партии чанков.
+                На уже сохраненный индекс не влияет.
+            precision: Точность инференса модели: "fp32", "fp16" (только при наличии CUDA)
+                или "bf16" (CPU с поддержкой AVX512-BF16). Эмбеддинги на выходе всегда float32.
         """
         self.model_name = model_name
+        self.quantize_int8 = quantize_int8
+        self.precision = precision
         self.embeddings_dir = Path(embeddings_dir)
         self.embeddings_dir.mkdir(parents=True, exist_ok=True)
         
@@ -38,21 +66,69 @@ class EmbeddingManager:
         self.metadata_path = self.embeddings_dir / "chunks_metadata.pkl"
         self.bm25_path = self.embeddings_dir / "bm25_index.pkl"
         
-        self.model = None
+        # Модель загружается при первом обращении к self.model
+        self._model = None
+        self._model_lock = threading.Lock()
         self.index = None
         self.bm25_index = None
         self.chunks_metadata = []
         
-        self._initialize_model()
+        # Обратные индексы: статья -> номера строк, (статья, секция) -> номера строк
+        self.arxiv_to_chunk_ids: Dict[str, List[int]] = {}
+        self.section_to_chunk_ids: Dict[Tuple[str, str], List[int]] = {}
+        
+        # BM25 индексы отдельных статей, строятся лениво при первом запросе
+        self.bm25_by_arxiv: Dict[str, BM25Okapi] = {}
+        
+        # Версия индекса, увеличивается при каждом добавлении чанков
+        self.index_version = 0
+        
+        # LRU-кэш эмбеддингов запросов (эмбеддинг зависит только от текста и модели)
+        self._encode_query_cached = functools.lru_cache(maxsize=1024)(self._encode_query_uncached)
+        
         self._load_existing_index()
     
+    @property
+    def model(self):
+        """
+        Модель эмбеддингов, загружаемая при первом использовании
+        """
+        if self._model is None:
+            with self._model_lock:
+                if self._model is None:
+                    self._model = self._initialize_model()
+        return self._model
+    
     def _initialize_model(self):
         """
         Инициализация модели для эмбеддингов
+        
+        Returns:
+            Загруженная модель SentenceTransformer
         """
+        # torch и sentence_transformers импортируются здесь: их загрузка занимает секунды
+        import torch
+        from sentence_transformers import SentenceTransformer
+        
         logger.info(f"Загрузка модели эмбеддингов: {self.model_name}")
-        self.model = SentenceTransformer(self.model_name)
+        model = SentenceTransformer(self.model_name)
         logger.info("Модель успешно загружена")
+        
+        if self.precision == "fp16":
+            if torch.cuda.is_available():
+                model.half()
+                logger.info("Модель переведена в fp16")
+            else:
+                logger.warning("fp16 доступен только на CUDA, используется fp32")
+        elif self.precision == "bf16":
+            bf16_check = getattr(torch.cpu, '_is_avx512_bf16_supported', None)
+            if torch.cuda.is_available() or (bf16_check and bf16_check()):
+                model.to(torch.bfloat16)
+                logger.info("Модель переведена в bf16")
+            else:
+                logger.warning("bf16 не поддерживается процессором, используется fp32")
+        
+        return model
     
     def _load_existing_index(self):
         """
@@ -70,6 +146,8 @@ class EmbeddingManager:
                 self.chunks_metadata = pickle.load(f)
                 logger.info(f"Метаданные загружены: {len(self.chunks_metadata)} чанков")
             
+            self._rebuild_metadata_index()
+            
             if self.bm25_path.exists() and BM25Okapi:
                 with open(self.bm25_path, 'rb') as f:
                     self.bm25_index = pickle.load(f)
@@ -82,10 +160,11 @@ class EmbeddingManager:
             self.index = None
             self.bm25_index = None
             self.chunks_metadata = []
+            self._rebuild_metadata_index()
     
     def create_embeddings(self, chunks: List[Dict]) -> Optional[np.ndarray]:
         """
-        Создание эмбеддингов для списка чанков
+        Создание нормализованных эмбеддингов для списка чанков
         
         Args:
             chunks: Список чанков с текстом
@@ -110,9 +189,13 @@ class EmbeddingManager:
                 texts,
                 batch_size=32,
                 show_progress_bar=True,
-                convert_to_numpy=True
+                convert_to_numpy=True,
+                normalize_embeddings=True
             )
             
+            # FAISS работает только с float32
+            embeddings = embeddings.astype(np.float32, copy=False)
+            
             logger.info(f"Эмбеддинги созданы: {embeddings.shape}")
             return embeddings
             
@@ -120,6 +203,31 @@ class EmbeddingManager:
             logger.error(f"Ошибка создания эмбеддингов: {e}")
             return None
     
+    def _create_index(self, embeddings: np.ndarray):
+        """
+        Создание нового FAISS индекса под размерность эмбеддингов
+        
+        Args:
+            embeddings: Первая партия нормализованных эмбеддингов
+            
+        Returns:
+            Пустой FAISS индекс со скалярным произведением в качестве метрики
+        """
+        dimension = embeddings.shape[1]
+        
+        if self.quantize_int8:
+            index = faiss.IndexScalarQuantizer(
+                dimension, faiss.ScalarQuantizer.QT_8bit, faiss.METRIC_INNER_PRODUCT
+            )
+            # Квантизатор подбирает диапазоны значений по каждой размерности
+            index.train(embeddings)
+            logger.info(f"Создан новый int8 FAISS индекс с размерностью {dimension}")
+        else:
+            index = faiss.IndexFlatIP(dimension)
+            logger.info(f"Создан новый FAISS индекс с размерностью {dimension}")
+        
+        return index
+    
     def add_to_index(self, chunks: List[Dict]) -> bool:
         """
         Добавление чанков в FAISS индекс
@@ -137,11 +245,7 @@ class EmbeddingManager:
         
         try:
             if self.index is None:
-                dimension = embeddings.shape[1]
-                self.index = faiss.IndexFlatIP(dimension)
-                logger.info(f"Создан новый FAISS индекс с размерностью {dimension}")
-            
-            faiss.normalize_L2(embeddings)
+                self.index = self._create_index(embeddings)
             
             start_id = len(self.chunks_metadata)
             self.index.add(embeddings)
@@ -154,8 +258,17 @@ class EmbeddingManager:
                     'chunk_id': chunk.get('chunk_id', i)
                 }
                 self.chunks_metadata.append(chunk_metadata)
+                self._index_chunk_metadata(start_id + i, chunk_metadata)
+            
+            updated_arxiv_ids = {chunk['metadata'].get('arxiv_id') for chunk in chunks}
+            self._sort_metadata_index(updated_arxiv_ids)
+            
+            # BM25 индексы изменившихся статей пересоберутся при следующем запросе
+            for arxiv_id in updated_arxiv_ids:
+                self.bm25_by_arxiv.pop(arxiv_id, None)
 
             self._create_bm25_index()
+            self.index_version += 1
             
             logger.info(f"Добавлено {len(chunks)} чанков в индекс. Всего: {self.index.ntotal}")
 
@@ -167,54 +280,248 @@ class EmbeddingManager:
             logger.error(f"Ошибка добавления в индекс: {e}")
             return False
     
-    def search(self, query: str, k: int = 1) -> List[Dict]:
+    def _encode_query_uncached(self, query: str) -> np.ndarray:
+        """
+        Вычисление нормализованного эмбеддинга запроса
+        
+        Args:
+            query: Текст запроса
+            
+        Returns:
+            Нормализованный вектор float32
+        """
+        embedding = self.model.encode([query], convert_to_numpy=True, normalize_embeddings=True)
+        return embedding[0].astype(np.float32, copy=False)
+    
+    def encode_query(self, query: str) -> np.ndarray:
+        """
+        Получение эмбеддинга запроса с кэшированием
+        
+        Args:
+            query: Текст запроса
+            
+        Returns:
+            Нормализованный вектор float32 (не изменять: он разделяется кэшем)
+        """
+        return self._encode_query_cached(query)
+    
+    def get_embeddings(self, row_ids: List[int]) -> np.ndarray:
+        """
+        Получение сохраненных эмбеддингов чанков из FAISS индекса
+        
+        Args:
+            row_ids: Номера строк чанков в индексе
+            
+        Returns:
+            Матрица нормализованных эмбеддингов (по строке на чанк);
+            для int8 индекса векторы декодируются обратно в float32
+        """
+        try:
+            return np.vstack([self.index.reconstruct(int(row_id)) for row_id in row_ids])
+        except RuntimeError as e:
+            # Не все типы FAISS индексов хранят восстановимые векторы -
+            # тогда пересчитываем эмбеддинги одним батчем
+            logger.warning(f"Индекс не поддерживает восстановление векторов, пересчитываем: {e}")
+            texts = [self.chunks_metadata[row_id]['text'] for row_id in row_ids]
+            embeddings = self.model.encode(
+                texts,
+                batch_size=32,
+                convert_to_numpy=True,
+                normalize_embeddings=True
+            )
+            return embeddings.astype(np.float32, copy=False)
+    
+    def search(self, query: str, k: int = 1, arxiv_id: Optional[str] = None) -> List[Dict]:
         """
         Поиск наиболее похожих чанков
         
         Args:
             query: Поисковый запрос
             k: Количество результатов
+            arxiv_id: ID статьи для ограничения поиска (опционально)
             
         Returns:
             Список найденных чанков с оценками релевантности
         """
+        results = self.batch_search([query], k=k, arxiv_id=arxiv_id)[0]
+        logger.info(f"Найдено {len(results)} результатов для запроса: '{query[:50]}...'")
+        return results
+    
+    def batch_search(self, queries: List[str], k: int = 1, arxiv_id: Optional[str] = None) -> List[List[Dict]]:
+        """
+        Поиск по нескольким запросам одним вызовом FAISS
+        
+        Args:
+            queries: Поисковые запросы
+            k: Количество результатов на запрос
+            arxiv_id: ID статьи для ограничения поиска (опционально)
+            
+        Returns:
+            Списки найденных чанков с оценками релевантности, по одному на запрос
+        """
+        empty = [[] for _ in queries]
+        
         if not self.model or not self.index:
             logger.error("Модель или индекс не инициализированы")
-            return []
+            return empty
         
         if self.index.ntotal == 0:
             logger.warning("Индекс пуст")
-            return []
+            return empty
         
         try:
-            query_embedding = self.model.encode([query], convert_to_numpy=True)
-            
-            faiss.normalize_L2(query_embedding)
-            
-            scores, indices = self.index.search(query_embedding, k)
-            
-            results = []
-            for i, (score, idx) in enumerate(zip(scores[0], indices[0])):
-                if idx == -1:
-                    continue
+            # Эмбеддинги запросов из кэша собираем в матрицу (n, d)
+            query_embeddings = np.vstack([self.encode_query(query) for query in queries])
+            
+            if arxiv_id:
+                row_ids = self.arxiv_to_chunk_ids.get(arxiv_id)
+                if not row_ids:
+                    logger.warning(f"В индексе нет чанков статьи {arxiv_id}")
+                    return empty
                 
-                chunk_metadata = self.chunks_metadata[idx]
-                result = {
-                    'text': chunk_metadata['text'],
-                    'metadata': chunk_metadata['metadata'],
-                    'score': float(score),
-                    'rank': i + 1,
-                    'chunk_id': chunk_metadata['chunk_id']
-                }
-                results.append(result)
+                # Ограничиваем поиск строками статьи на стороне FAISS
+                ids = np.asarray(row_ids, dtype=np.int64)
+                selector = faiss.IDSelectorBatch(len(ids), faiss.swig_ptr(ids))
+                params = faiss.SearchParameters(sel=selector)
+                scores, indices = self.index.search(query_embeddings, min(k, len(ids)), params=params)
+            else:
+                scores, indices = self.index.search(query_embeddings, k)
+            
+            all_results = []
+            for query_scores, query_indices in zip(scores, indices):
+                results = []
+                for i, (score, idx) in enumerate(zip(query_scores, query_indices)):
+                    if idx == -1:
+                        continue
+                    
+                    chunk_metadata = self.chunks_metadata[idx]
+                    result = {
+                        'id': int(idx),
+                        'text': chunk_metadata['text'],
+                        'metadata': chunk_metadata['metadata'],
+                        'score': float(score),
+                        'rank': i + 1,
+                        'chunk_id': chunk_metadata['chunk_id']
+                    }
+                    results.append(result)
+                all_results.append(results)
             
-            logger.info(f"Найдено {len(results)} результатов для запроса: '{query[:50]}...'")
-            return results
+            return all_results
             
         except Exception as e:
             logger.error(f"Ошибка поиска: {e}")
-            return []
+            return empty
+    
+    
+    def _index_chunk_metadata(self, row_id: int, chunk_metadata: Dict):
+        """
+        Добавление чанка в обратные индексы по статье и секции
+        
+        Args:
+            row_id: Номер строки чанка в FAISS индексе и chunks_metadata
+            chunk_metadata: Запись из chunks_metadata
+        """
+        metadata = chunk_metadata.get('metadata', {})
+        
+        # Превью для контекста считается один раз при индексации
+        if 'preview' not in metadata:
+            metadata['preview'] = make_preview(chunk_metadata['text'])
+        
+        arxiv_id = metadata.get('arxiv_id')
+        if arxiv_id is None:
+            return
+        
+        self.arxiv_to_chunk_ids.setdefault(arxiv_id, []).append(row_id)
+        
+        section = metadata.get('section')
+        if section is not None:
+            self.section_to_chunk_ids.setdefault((arxiv_id, section), []).append(row_id)
+    
+    def _sort_metadata_index(self, arxiv_ids):
+        """
+        Упорядочивание строк статей в обратных индексах по порядку в документе
+        
+        Args:
+            arxiv_ids: ID статей, списки которых изменились
+        """
+        def chunk_position(row_id: int) -> int:
+            chunk_index = self.chunks_metadata[row_id]['metadata'].get('chunk_index')
+            return -1 if chunk_index is None else chunk_index
+        
+        # Сортировка стабильна, поэтому при повторной индексации первой остается старая строка
+        for arxiv_id in arxiv_ids:
+            if arxiv_id in self.arxiv_to_chunk_ids:
+                self.arxiv_to_chunk_ids[arxiv_id].sort(key=chunk_position)
+        
+        for (arxiv_id, _), row_ids in self.section_to_chunk_ids.items():
+            if arxiv_id in arxiv_ids:
+                row_ids.sort(key=chunk_position)
     
+    def _rebuild_metadata_index(self):
+        """
+        Пересборка обратных индексов из загруженных метаданных
+        """
+        self.arxiv_to_chunk_ids = {}
+        self.section_to_chunk_ids = {}
+        self.bm25_by_arxiv = {}
+        for row_id, chunk_metadata in enumerate(self.chunks_metadata):
+            self._index_chunk_metadata(row_id, chunk_metadata)
+        self._sort_metadata_index(set(self.arxiv_to_chunk_ids))
+    
+    def _collect_chunks(self, row_ids: List[int]) -> List[Dict]:
+        """
+        Сбор чанков по номерам строк, уже упорядоченным по порядку в документе
+        
+        Args:
+            row_ids: Номера строк в chunks_metadata
+            
+        Returns:
+            Список уникальных по chunk_index чанков в порядке документа
+        """
+        chunks = []
+        seen_chunk_indices = set()
+        
+        for row_id in row_ids:
+            chunk_data = self.chunks_metadata[row_id]
+            chunk_index = chunk_data['metadata'].get('chunk_index')
+            
+            # Пропускаем чанки без позиции и повторно проиндексированные
+            if chunk_index is None or chunk_index in seen_chunk_indices:
+                continue
+            
+            seen_chunk_indices.add(chunk_index)
+            chunks.append({
+                'text': chunk_data['text'],
+                'metadata': chunk_data['metadata'],
+                'chunk_id': chunk_data['chunk_id']
+            })
+        
+        return chunks
+    
+    def get_chunks_by_arxiv(self, arxiv_id: str) -> List[Dict]:
+        """
+        Получение всех чанков статьи без обращения к FAISS
+        
+        Args:
+            arxiv_id: ID статьи arXiv
+            
+        Returns:
+            Список чанков статьи, отсортированных по порядку в документе
+        """
+        return self._collect_chunks(self.arxiv_to_chunk_ids.get(arxiv_id, []))
+    
+    def get_section_chunks(self, arxiv_id: str, section: str) -> List[Dict]:
+        """
+        Получение всех чанков секции статьи без обращения к FAISS
+        
+        Args:
+            arxiv_id: ID статьи arXiv
+            section: Название секции
+            
+        Returns:
+            Список чанков секции, отсортированных по порядку в документе
+        """
+        return self._collect_chunks(self.section_to_chunk_ids.get((arxiv_id, section), []))
     
     def _save_index(self):
         """
@@ -263,21 +570,42 @@ class EmbeddingManager:
             logger.error(f"Ошибка создания BM25 индекса: {e}")
             self.bm25_index = None
     
-    def bm25_search(self, query: str, k: int = 5) -> List[Dict]:
+    def _get_article_bm25(self, arxiv_id: str) -> Optional[BM25Okapi]:
+        """
+        Получение BM25 индекса, построенного только по чанкам статьи
+        
+        Args:
+            arxiv_id: ID статьи arXiv
+            
+        Returns:
+            BM25 индекс статьи или None, если у статьи нет чанков
+        """
+        bm25 = self.bm25_by_arxiv.get(arxiv_id)
+        if bm25 is not None:
+            return bm25
+        
+        row_ids = self.arxiv_to_chunk_ids.get(arxiv_id)
+        if not row_ids:
+            return None
+        
+        corpus = [self.chunks_metadata[row_id]['text'].lower().split() for row_id in row_ids]
+        bm25 = BM25Okapi(corpus)
+        self.bm25_by_arxiv[arxiv_id] = bm25
+        logger.info(f"BM25 индекс статьи {arxiv_id} создан для {len(corpus)} документов")
+        return bm25
+    
+    def bm25_search(self, query: str, k: int = 5, arxiv_id: Optional[str] = None) -> List[Dict]:
         """
         Поиск с использованием BM25
         
         Args:
             query: Поисковый запрос
             k: Количество результатов
+            arxiv_id: ID статьи для ограничения поиска (опционально)
             
         Returns:
             Список найденных чанков с BM25 оценками
         """
-        if not self.bm25_index:
-            logger.warning("BM25 индекс не инициализирован")
-            return []
-        
         if not self.chunks_metadata:
             return []
         
@@ -285,24 +613,32 @@ class EmbeddingManager:
             # Токенизируем запрос
             query_tokens = query.lower().split()
             
-            # Получаем BM25 scores
-            scores = self.bm25_index.get_scores(query_tokens)
-            
-            # Создаем результаты с индексами
-            results_with_scores = [(i, score) for i, score in enumerate(scores)]
+            # Для статьи считаем scores только по ее чанкам, иначе - по всей коллекции
+            if arxiv_id:
+                bm25 = self._get_article_bm25(arxiv_id)
+                if bm25 is None:
+                    return []
+                row_ids = np.asarray(self.arxiv_to_chunk_ids[arxiv_id], dtype=np.int64)
+            else:
+                if not self.bm25_index:
+                    logger.warning("BM25 индекс не инициализирован")
+                    return []
+                bm25 = self.bm25_index
+                row_ids = np.arange(len(self.chunks_metadata))
             
-            # Сортируем по убыванию score
-            results_with_scores.sort(key=lambda x: x[1], reverse=True)
+            # Получаем BM25 scores
+            scores = np.asarray(bm25.get_scores(query_tokens))
             
-            # Берем топ-k результатов
-            top_results = results_with_scores[:k]
+            # Сортируем по убыванию score и берем топ-k результатов
+            order = np.argsort(-scores, kind='stable')[:k]
             
             # Формируем финальные результаты
             results = []
-            for idx, score in top_results:
+            for idx, score in zip(row_ids[order].tolist(), scores[order].tolist()):
                 if idx < len(self.chunks_metadata):
                     chunk_data = self.chunks_metadata[idx]
                     result = {
+                        'id': idx,
                         'text': chunk_data['text'],
                         'metadata': chunk_data['metadata'],
                         'score': float(score),
@@ -331,7 +667,7 @@ class EmbeddingManager:
             'index_size': self.index.ntotal if self.index else 0,
             'model_name': self.model_name,
             'index_exists': self.index is not None,
-            'model_loaded': self.model is not None
+            'model_loaded': self._model is not None
         }
         
         # Статистика по статьям
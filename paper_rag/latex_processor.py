@@ -4,6 +4,7 @@
 
 import os
 import re
+import functools
 import tarfile
 import tempfile
 from pathlib import Path
@@ -12,6 +13,71 @@ import logging
 
 logger = logging.getLogger(__name__)
 
+# Приоритетные имена основного LaTeX файла
+MAIN_TEX_NAMES = ('main.tex', 'article.tex', 'paper.tex')
+
+# Команды секционирования, соответствующие section_patterns
+SECTION_COMMANDS = ('\\section', '\\subsection', '\\subsubsection', '\\chapter', '\\part')
+
+# Максимальный размер LaTeX файла, передаваемый в regex обработку
+MAX_LATEX_CHARS = 5_000_000
+
+# Таблица для удаления управляющих символов (кроме \t, \n, \r) через str.translate
+_CONTROL_CHARS_TABLE = dict.fromkeys(c for c in range(32) if c not in (9, 10, 13))
+
+@functools.lru_cache(maxsize=1024)
+def _detect_file_type_cached(file_path: str, mtime: float) -> str:
+    """
+    Определение типа файла по магическим числам (кэшируется по пути и mtime)
+    
+    Args:
+        file_path: Путь к файлу
+        mtime: Время модификации файла (ключ инвалидации кэша)
+        
+    Returns:
+        Тип файла: 'gzip', 'pdf', 'zip', 'latex', 'html', 'unknown'
+    """
+    with open(file_path, 'rb') as f:
+        # Читаем первые 10 байт для определения типа
+        header = f.read(10)
+    
+    # Проверяем магические числа
+    if header.startswith(b'\x1f\x8b'):
+        return 'gzip'  # gzip архив
+    elif header.startswith(b'%PDF'):
+        return 'pdf'    # PDF документ
+    elif header.startswith(b'PK'):
+        return 'zip'    # ZIP архив
+    # Дополнительные проверки
+    elif header.startswith(b'\\documentclass') or header.startswith(b'\\begin{document'):
+        return 'latex'  # LaTeX файл
+    elif header.startswith(b'<!DOCTYPE') or header.startswith(b'<html'):
+        return 'html'   # HTML файл
+    return 'unknown'
+
+def _iter_tex(root: Path):
+    """
+    Ленивый обход дерева каталогов с выдачей .tex файлов через os.scandir
+    
+    Args:
+        root: Корневая папка
+        
+    Yields:
+        os.DirEntry для каждого найденного .tex файла
+    """
+    stack = [str(root)]
+    while stack:
+        current_dir = stack.pop()
+        try:
+            with os.scandir(current_dir) as it:
+                for entry in it:
+                    if entry.is_dir(follow_symlinks=False):
+                        stack.append(entry.path)
+                    elif entry.name.lower().endswith('.tex'):
+                        yield entry
+        except OSError as e:
+            logger.warning(f"Не удалось прочитать папку {current_dir}: {e}")
+
 class LatexProcessor:
     """
     Класс для обработки LaTeX файлов и извлечения структурированного текста
@@ -65,9 +131,10 @@ class LatexProcessor:
             with tempfile.TemporaryDirectory() as temp_dir:
                 temp_path = Path(temp_dir)
                 
-                # Распаковываем архив
-                with tarfile.open(source_path, 'r:gz') as tar:
-                    tar.extractall(temp_path)
+                # Распаковываем архив за один последовательный проход (потоковый режим)
+                with tarfile.open(source_path, 'r|gz') as tar:
+                    for member in tar:
+                        tar.extract(member, temp_path)
                 
                 # Ищем основной LaTeX файл
                 main_tex = self._find_main_tex(temp_path)
@@ -93,26 +160,7 @@ class LatexProcessor:
             Тип файла: 'gzip', 'pdf', 'zip', 'unknown'
         """
         try:
-            with open(file_path, 'rb') as f:
-                # Читаем первые 10 байт для определения типа
-                header = f.read(10)
-                
-                # Проверяем магические числа
-                if header.startswith(b'\x1f\x8b'):
-                    return 'gzip'  # gzip архив
-                elif header.startswith(b'%PDF'):
-                    return 'pdf'    # PDF документ
-                elif header.startswith(b'PK'):
-                    return 'zip'    # ZIP архив
-                else:
-                    # Дополнительные проверки
-                    if header.startswith(b'\\documentclass') or header.startswith(b'\\begin{document'):
-                        return 'latex'  # LaTeX файл
-                    elif header.startswith(b'<!DOCTYPE') or header.startswith(b'<html'):
-                        return 'html'   # HTML файл
-                    else:
-                        return 'unknown'
-                        
+            return _detect_file_type_cached(str(file_path), os.path.getmtime(file_path))
         except Exception as e:
             logger.error(f"Ошибка при определении типа файла {file_path}: {e}")
             return 'unknown'
@@ -127,22 +175,36 @@ class LatexProcessor:
         Returns:
             Путь к основному .tex файлу
         """
-        # Ищем .tex файлы
-        tex_files = list(temp_path.rglob("*.tex"))
-        
-        if not tex_files:
-            return None
-        
-        # Приоритет: main.tex, article.tex, paper.tex, первый найденный
-        priority_names = ['main.tex', 'article.tex', 'paper.tex']
-        
-        for name in priority_names:
-            for tex_file in tex_files:
-                if tex_file.name.lower() == name:
-                    return tex_file
+        # Быстрая проверка приоритетных имен в корне архива без обхода дерева
+        for name in MAIN_TEX_NAMES:
+            candidate = temp_path / name
+            if candidate.exists():
+                return candidate
+        
+        # Обходим дерево один раз: запоминаем первый найденный файл и лучший
+        # по приоритету, выходим сразу при нахождении main.tex
+        first_found = None
+        best_rank = len(MAIN_TEX_NAMES)
+        best_match = None
+        
+        for entry in _iter_tex(temp_path):
+            if first_found is None:
+                first_found = entry
+            
+            name = entry.name.lower()
+            if name in MAIN_TEX_NAMES:
+                rank = MAIN_TEX_NAMES.index(name)
+                if rank < best_rank:
+                    best_rank = rank
+                    best_match = entry
+                    if rank == 0:
+                        break
+        
+        if best_match is not None:
+            return Path(best_match.path)
         
         # Возвращаем первый найденный
-        return tex_files[0]
+        return Path(first_found.path) if first_found is not None else None
     
     def _process_latex_file(self, tex_path: Path) -> Dict:
         """
@@ -158,6 +220,18 @@ class LatexProcessor:
             with open(tex_path, 'r', encoding='utf-8', errors='ignore') as f:
                 content = f.read()
             
+            # Быстрая проверка до regex обработки: NUL байты означают бинарный файл
+            if '\x00' in content:
+                logger.warning(f"Файл {tex_path} содержит бинарные данные, пропускаем")
+                return None
+            
+            if len(content) > MAX_LATEX_CHARS:
+                logger.warning(f"Файл {tex_path} слишком большой ({len(content)} символов), обрезаем до {MAX_LATEX_CHARS}")
+                content = content[:MAX_LATEX_CHARS]
+            
+            # Удаляем управляющие символы одним проходом на уровне C
+            content = content.translate(_CONTROL_CHARS_TABLE)
+            
             # Извлекаем структуру
             structure = self._extract_structure(content)
             
@@ -221,7 +295,8 @@ class LatexProcessor:
             structure['abstract'] = abstract_match.group(1).strip()
         
         # Извлекаем секции
-        for pattern in self.section_patterns:
+        section_patterns = self.section_patterns if self._has_sections(content) else []
+        for pattern in section_patterns:
             # Используем finditer для получения полного совпадения и позиции
             for match in re.finditer(pattern, content):
                 section_title = match.group(1).strip()  # Содержимое в скобках
@@ -253,6 +328,10 @@ class LatexProcessor:
         
         return structure
     
+    def _has_sections(self, content: str) -> bool:
+        """Быстрая проверка наличия команд секционирования без regex"""
+        return any(command in content for command in SECTION_COMMANDS)
+    
     def _get_section_level(self, pattern: str) -> int:
         """Определяет уровень секции"""
         if 'chapter' in pattern or 'part' in pattern:
@@ -287,9 +366,8 @@ class LatexProcessor:
         # Убираем простые LaTeX команды
         text = re.sub(r'\\[a-zA-Z]+', '', text)
         
-        # Убираем лишние пробелы и переносы строк
-        text = re.sub(r'\s+', ' ', text)
-        text = text.strip()
+        # Убираем лишние пробелы и переносы строк (split/join без regex)
+        text = ' '.join(text.split())
         
         return text
     
@@ -306,6 +384,10 @@ class LatexProcessor:
         """
         sections = []
         
+        # Нет ни одной команды секционирования - regex проход не нужен
+        if not self._has_sections(content):
+            return sections
+        
         # Сортируем секции по позиции в тексте
         section_positions = []
         for pattern in self.section_patterns:
@@ -2,15 +2,44 @@
 Модуль для обработки PDF статей из arXiv
 """
 
+import os
 import re
-from typing import Dict, Optional
+import json
+import hashlib
+import threading
+from concurrent.futures import ThreadPoolExecutor, ProcessPoolExecutor, as_completed
+from typing import Dict, List, Optional, Tuple
 import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
 from pathlib import Path
 import logging
 import PyPDF2
 
 logger = logging.getLogger(__name__)
 
+# Предкомпилированные паттерны для clean_text
+_WS = re.compile(r'\s+')
+_BADCHARS = re.compile(r'[^\w\s\.\,\!\?\;\:\-\(\)\/\[\]\{\}\"\']+')
+_DOTS = re.compile(r'\.{3,}')
+_DASHES = re.compile(r'-{3,}')
+
+# Блокировка для индекса скачанных PDF (процессор используется из нескольких потоков)
+_index_lock = threading.Lock()
+
+def _extract_text_worker(data_dir: str, pdf_path: str) -> Optional[Dict]:
+    """
+    Извлечение текста в отдельном процессе (для ProcessPoolExecutor)
+    
+    Args:
+        data_dir: Директория с PDF файлами
+        pdf_path: Путь к PDF файлу
+        
+    Returns:
+        Словарь с извлеченным текстом и метаданными
+    """
+    return PDFProcessor(data_dir).extract_text_pypdf2(pdf_path)
+
 class PDFProcessor:
     """
     Класс для обработки PDF файлов статей из arXiv
@@ -25,6 +54,148 @@ class PDFProcessor:
         """
         self.data_dir = Path(data_dir)
         self.data_dir.mkdir(parents=True, exist_ok=True)
+        
+        # Индекс arxiv_id -> sha256 содержимого PDF и кэш извлеченного текста по хэшу
+        self.index_path = self.data_dir / "index.json"
+        self.extracted_dir = self.data_dir / "extracted"
+        self.extracted_dir.mkdir(parents=True, exist_ok=True)
+        
+        # Общая HTTP сессия: keep-alive соединения к arxiv.org и повторы при 5xx
+        self.session = requests.Session()
+        adapter = HTTPAdapter(
+            pool_connections=16,
+            pool_maxsize=16,
+            max_retries=Retry(total=3, backoff_factor=0.5, status_forcelist=[502, 503, 504])
+        )
+        self.session.mount("https://", adapter)
+        self.session.mount("http://", adapter)
+    
+    def _read_index(self) -> Dict:
+        """
+        Чтение индекса скачанных PDF
+        
+        Returns:
+            Словарь arxiv_id -> {'sha256': ..., 'extracted': ...}
+        """
+        if not self.index_path.exists():
+            return {}
+        
+        try:
+            with open(self.index_path, 'r', encoding='utf-8') as f:
+                return json.load(f)
+        except Exception as e:
+            logger.warning(f"Не удалось прочитать индекс PDF {self.index_path}: {e}")
+            return {}
+    
+    def _update_index(self, arxiv_id: str, **fields) -> None:
+        """
+        Обновление записи индекса с атомарной записью на диск
+        
+        Args:
+            arxiv_id: Идентификатор arXiv статьи
+            **fields: Поля записи для обновления
+        """
+        with _index_lock:
+            index = self._read_index()
+            index.setdefault(arxiv_id, {}).update(fields)
+            
+            tmp_path = self.index_path.with_suffix('.json.tmp')
+            with open(tmp_path, 'w', encoding='utf-8') as f:
+                json.dump(index, f, ensure_ascii=False, indent=2)
+            os.replace(tmp_path, self.index_path)
+    
+    def _get_index_entry(self, arxiv_id: str, pdf_path: str) -> Optional[Dict]:
+        """
+        Получение записи индекса для PDF на диске
+        
+        Если записи нет (файл скачан до появления индекса) или PDF изменился
+        после записи (mtime отличается), хэш пересчитывается по файлу.
+        
+        Args:
+            arxiv_id: Идентификатор arXiv статьи
+            pdf_path: Путь к PDF файлу
+            
+        Returns:
+            Запись индекса или None при ошибке
+        """
+        try:
+            mtime = os.path.getmtime(pdf_path)
+            entry = self._read_index().get(arxiv_id)
+            
+            if entry and entry.get('sha256') and entry.get('mtime') == mtime:
+                return entry
+            
+            sha256 = hashlib.sha256()
+            with open(pdf_path, 'rb') as f:
+                for chunk in iter(lambda: f.read(64 * 1024), b''):
+                    sha256.update(chunk)
+            
+            entry = {
+                'sha256': sha256.hexdigest(),
+                'mtime': mtime,
+                'extracted': self._extraction_cache_path(sha256.hexdigest()).exists()
+            }
+            self._update_index(arxiv_id, **entry)
+            return entry
+            
+        except Exception as e:
+            logger.warning(f"Не удалось получить запись индекса для {pdf_path}: {e}")
+            return None
+    
+    def _extraction_cache_path(self, sha256: str) -> Path:
+        """Путь к кэшу извлеченного текста для PDF с данным хэшем"""
+        return self.extracted_dir / f"{sha256}.json"
+    
+    def _load_cached_extraction(self, arxiv_id: str, pdf_path: str) -> Optional[Dict]:
+        """
+        Загрузка ранее извлеченного текста по хэшу содержимого PDF
+        
+        Args:
+            arxiv_id: Идентификатор arXiv статьи
+            pdf_path: Путь к PDF файлу
+            
+        Returns:
+            Извлеченные данные или None, если кэша нет
+        """
+        entry = self._get_index_entry(arxiv_id, pdf_path)
+        if not entry or not entry.get('sha256'):
+            return None
+        
+        cache_path = self._extraction_cache_path(entry['sha256'])
+        if not cache_path.exists():
+            return None
+        
+        try:
+            with open(cache_path, 'r', encoding='utf-8') as f:
+                extracted_data = json.load(f)
+            logger.info(f"Используем кэш извлеченного текста для {arxiv_id}: {cache_path}")
+            return extracted_data
+        except Exception as e:
+            logger.warning(f"Не удалось загрузить кэш извлечения {cache_path}: {e}")
+            return None
+    
+    def _save_cached_extraction(self, arxiv_id: str, pdf_path: str, extracted_data: Dict) -> None:
+        """
+        Сохранение извлеченного текста в кэш по хэшу содержимого PDF
+        
+        Args:
+            arxiv_id: Идентификатор arXiv статьи
+            pdf_path: Путь к PDF файлу
+            extracted_data: Результат извлечения текста
+        """
+        entry = self._get_index_entry(arxiv_id, pdf_path)
+        if not entry or not entry.get('sha256'):
+            return
+        
+        cache_path = self._extraction_cache_path(entry['sha256'])
+        try:
+            tmp_path = cache_path.with_suffix('.json.tmp')
+            with open(tmp_path, 'w', encoding='utf-8') as f:
+                json.dump(extracted_data, f, ensure_ascii=False)
+            os.replace(tmp_path, cache_path)
+            self._update_index(arxiv_id, extracted=True)
+        except Exception as e:
+            logger.warning(f"Не удалось сохранить кэш извлечения {cache_path}: {e}")
     
     def download_pdf(self, arxiv_id: str, pdf_url: str) -> Optional[str]:
         """
@@ -49,12 +220,30 @@ class PDFProcessor:
             
             # Скачиваем PDF
             logger.info(f"Скачивание PDF: {pdf_url}")
-            response = requests.get(pdf_url, timeout=30)
-            response.raise_for_status()
+            with self.session.get(pdf_url, timeout=30, stream=True) as response:
+                response.raise_for_status()
+                
+                # Сохраняем файл по частям, одновременно считая хэш содержимого
+                sha256 = hashlib.sha256()
+                tmp_path = pdf_path.with_suffix('.pdf.part')
+                try:
+                    with open(tmp_path, 'wb') as f:
+                        for chunk in response.iter_content(chunk_size=64 * 1024):
+                            if chunk:
+                                sha256.update(chunk)
+                                f.write(chunk)
+                    os.replace(tmp_path, pdf_path)
+                except BaseException:
+                    # Не оставляем недокачанный PDF на диске
+                    tmp_path.unlink(missing_ok=True)
+                    raise
             
-            # Сохраняем файл
-            with open(pdf_path, 'wb') as f:
-                f.write(response.content)
+            self._update_index(
+                arxiv_id,
+                sha256=sha256.hexdigest(),
+                mtime=os.path.getmtime(pdf_path),
+                extracted=self._extraction_cache_path(sha256.hexdigest()).exists()
+            )
             
             logger.info(f"PDF сохранен: {pdf_path}")
             return str(pdf_path)
@@ -80,37 +269,32 @@ class PDFProcessor:
         try:
             logger.info(f"Извлечение текста с PyPDF2: {pdf_path}")
             
-            text_by_page = []
-            
             with open(pdf_path, 'rb') as file:
                 pdf_reader = PyPDF2.PdfReader(file)
                 
-                for page_num, page in enumerate(pdf_reader.pages, 1):
+                # Заполняем текст страниц по позициям, без промежуточных словарей
+                page_texts = [None] * len(pdf_reader.pages)
+                for page_num, page in enumerate(pdf_reader.pages):
                     try:
-                        page_text = page.extract_text()
-                        text_by_page.append({
-                            'page': page_num,
-                            'text': page_text
-                        })
+                        page_texts[page_num] = page.extract_text()
                     except Exception as e:
-                        logger.warning(f"Ошибка извлечения страницы {page_num}: {e}")
-                        continue
+                        logger.warning(f"Ошибка извлечения страницы {page_num + 1}: {e}")
             
-            # Объединяем весь текст
-            full_text = '\n\n'.join([page['text'] for page in text_by_page])
+            # Объединяем текст успешно извлеченных страниц
+            page_texts = [text for text in page_texts if text is not None]
+            full_text = '\n\n'.join(page_texts)
             
             extracted_data = {
                 'text': full_text,
-                'pages': text_by_page,
                 'metadata': {
                     'source': 'pypdf2',
                     'file_path': pdf_path,
                     'extraction_method': 'pypdf2',
-                    'total_pages': len(text_by_page)
+                    'total_pages': len(page_texts)
                 }
             }
             
-            logger.info(f"Успешно извлечен текст: {len(full_text)} символов, {len(text_by_page)} страниц")
+            logger.info(f"Успешно извлечен текст: {len(full_text)} символов, {len(page_texts)} страниц")
             return extracted_data
             
         except Exception as e:
@@ -136,20 +320,106 @@ class PDFProcessor:
         if not pdf_path:
             return None
         
-        # Извлекаем текст (пробуем все доступные методы)
-        extracted_data = self.extract_text_pypdf2(pdf_path)
-        if not extracted_data:
-            logger.error(f"Не удалось извлечь текст из {arxiv_id}")
-            return None
+        # Если содержимое PDF уже обрабатывалось, берем текст из кэша
+        extracted_data = self._load_cached_extraction(arxiv_id, pdf_path)
         
-        # Добавляем информацию о статье
-        extracted_data['metadata']['arxiv_id'] = arxiv_id
-        extracted_data['metadata']['pdf_url'] = pdf_url
-        extracted_data['metadata']['pdf_path'] = pdf_path  # Добавляем путь к PDF для визуального анализа
+        if extracted_data:
+            extracted_data['metadata']['file_path'] = pdf_path
+        else:
+            # Извлекаем текст (пробуем все доступные методы)
+            extracted_data = self.extract_text_pypdf2(pdf_path)
+            if not extracted_data:
+                logger.error(f"Не удалось извлечь текст из {arxiv_id}")
+                return None
+            
+            self._save_cached_extraction(arxiv_id, pdf_path, extracted_data)
+        
+        self._attach_article_metadata(extracted_data, arxiv_id, pdf_url, pdf_path)
         
         logger.info(f"Обработка статьи {arxiv_id} завершена успешно")
         return extracted_data
     
+    def process_articles(self, items: List[Tuple[str, str]],
+                         download_workers: int = 8,
+                         extract_workers: Optional[int] = None) -> Dict[str, Optional[Dict]]:
+        """
+        Пакетная обработка статей: параллельное скачивание и извлечение текста
+        
+        Скачивание (I/O) выполняется в пуле потоков, извлечение текста (CPU)
+        в пуле процессов, поэтому ожидание сети перекрывается с парсингом PDF.
+        
+        Args:
+            items: Список пар (arxiv_id, pdf_url)
+            download_workers: Количество потоков для скачивания
+            extract_workers: Количество процессов для извлечения (по умолчанию число CPU)
+            
+        Returns:
+            Словарь arxiv_id -> извлеченные данные (None при ошибке)
+        """
+        logger.info(f"Пакетная обработка {len(items)} статей")
+        results = {}
+        
+        with ThreadPoolExecutor(max_workers=download_workers) as downloader, \
+                ProcessPoolExecutor(max_workers=extract_workers) as extractor:
+            download_futures = {
+                downloader.submit(self.download_pdf, arxiv_id, pdf_url): (arxiv_id, pdf_url)
+                for arxiv_id, pdf_url in items
+            }
+            extract_futures = {}
+            
+            # Ставим извлечение в очередь по мере завершения скачиваний
+            for future in as_completed(download_futures):
+                arxiv_id, pdf_url = download_futures[future]
+                pdf_path = future.result()
+                if not pdf_path:
+                    results[arxiv_id] = None
+                    continue
+                
+                extracted_data = self._load_cached_extraction(arxiv_id, pdf_path)
+                if extracted_data:
+                    extracted_data['metadata']['file_path'] = pdf_path
+                    self._attach_article_metadata(extracted_data, arxiv_id, pdf_url, pdf_path)
+                    results[arxiv_id] = extracted_data
+                    continue
+                
+                future = extractor.submit(_extract_text_worker, str(self.data_dir), pdf_path)
+                extract_futures[future] = (arxiv_id, pdf_url, pdf_path)
+            
+            for future in as_completed(extract_futures):
+                arxiv_id, pdf_url, pdf_path = extract_futures[future]
+                try:
+                    extracted_data = future.result()
+                except Exception as e:
+                    logger.error(f"Ошибка извлечения текста из {arxiv_id}: {e}")
+                    extracted_data = None
+                
+                if not extracted_data:
+                    logger.error(f"Не удалось извлечь текст из {arxiv_id}")
+                    results[arxiv_id] = None
+                    continue
+                
+                self._save_cached_extraction(arxiv_id, pdf_path, extracted_data)
+                self._attach_article_metadata(extracted_data, arxiv_id, pdf_url, pdf_path)
+                results[arxiv_id] = extracted_data
+        
+        processed = sum(1 for data in results.values() if data)
+        logger.info(f"Пакетная обработка завершена: {processed}/{len(items)} статей")
+        return results
+    
+    def _attach_article_metadata(self, extracted_data: Dict, arxiv_id: str, pdf_url: str, pdf_path: str) -> None:
+        """
+        Добавление информации о статье в метаданные извлечения
+        
+        Args:
+            extracted_data: Результат извлечения текста
+            arxiv_id: Идентификатор arXiv статьи
+            pdf_url: URL PDF
+            pdf_path: Путь к PDF файлу
+        """
+        extracted_data['metadata']['arxiv_id'] = arxiv_id
+        extracted_data['metadata']['pdf_url'] = pdf_url
+        extracted_data['metadata']['pdf_path'] = pdf_path  # Добавляем путь к PDF для визуального анализа
+    
     def clean_text(self, text: str) -> str:
         """
         Очистка извлеченного текста
@@ -164,14 +434,14 @@ class PDFProcessor:
             return ""
         
         # Удаляем лишние пробелы и переносы
-        text = re.sub(r'\s+', ' ', text)
+        text = _WS.sub(' ', text)
         
         # Удаляем странные символы
-        text = re.sub(r'[^\w\s\.\,\!\?\;\:\-\(\)\/\[\]\{\}\"\']+', ' ', text)
+        text = _BADCHARS.sub(' ', text)
         
         # Удаляем повторяющиеся знаки препинания
-        text = re.sub(r'\.{3,}', '...', text)
-        text = re.sub(r'-{3,}', '---', text)
+        text = _DOTS.sub('...', text)
+        text = _DASHES.sub('---', text)
         
         return text.strip()
 
@@ -3,45 +3,68 @@
 """
 
 import re
+import heapq
 from typing import Dict, List, Optional, Tuple
 import logging
 
-from .embeddings import embedding_manager
+import numpy as np
+
+from .embeddings import embedding_manager, make_preview
+from .utils import TTLCache
 
 logger = logging.getLogger(__name__)
 
+# Все, кроме букв, цифр и пробелов. При наличии google-re2 используется
+# линейный DFA-движок; в RE2 \w только ASCII, поэтому классы заданы через Unicode
+try:
+    import re2
+    _NONWORD_RE = re2.compile(r'[^\p{L}\p{N}_\s]+')
+except ImportError:
+    re2 = None
+    _NONWORD_RE = re.compile(r'[^\w\s]+')
+
 class QueryProcessor:
     """
     Класс для обработки запросов и поиска релевантной информации
     """
     
+    # Фиксированные запросы для краткого изложения (их эмбеддинги попадают в кэш)
+    SUMMARY_QUERIES = (
+        "abstract introduction summary",
+        "conclusion results findings",
+        "methodology methods approach"
+    )
+    
     def __init__(self):
         """
         Инициализация процессора запросов
         """
         self.embedding_manager = embedding_manager
         
+        # Кэш результатов запросов: (обработанный запрос, статья, версия индекса) -> результат
+        self._results_cache = TTLCache(max_items=2048, ttl_sec=300)
+        
         # Настройки гибридного поиска (соотношение BM25:Dense = 3:7)
         self.BM25_WEIGHT = 0.3  # 30% веса для BM25 (лексический поиск)
         self.SEMANTIC_WEIGHT = 0.7  # 70% веса для semantic (dense embeddings)
         
         # Словари для улучшения запросов
         self.query_expansions = {
-            'что': ['содержание', 'суть', 'описание'],
-            'как': ['метод', 'способ', 'подход'],
-            'почему': ['причина', 'обоснование'],
-            'результат': ['вывод', 'заключение', 'итог'],
-            'метод': ['методология', 'подход', 'алгоритм'],
-            'эксперимент': ['исследование', 'тест', 'анализ']
+            'что': ('содержание', 'суть', 'описание'),
+            'как': ('метод', 'способ', 'подход'),
+            'почему': ('причина', 'обоснование'),
+            'результат': ('вывод', 'заключение', 'итог'),
+            'метод': ('методология', 'подход', 'алгоритм'),
+            'эксперимент': ('исследование', 'тест', 'анализ')
         }
         
         # Стоп-слова для фильтрации
-        self.stop_words = {
+        self.stop_words = frozenset({
             'что', 'как', 'где', 'когда', 'почему', 'какой', 'какая', 'какое',
             'в', 'на', 'с', 'по', 'для', 'из', 'к', 'от', 'при', 'о', 'об',
             'и', 'или', 'но', 'а', 'да', 'нет', 'не', 'ни', 'же', 'ли',
             'это', 'то', 'та', 'те', 'тот', 'эта', 'эти'
-        }
+        })
     
     def process_query(self, query: str, arxiv_id: Optional[str] = None) -> Dict:
         """
@@ -59,6 +82,13 @@ class QueryProcessor:
         # Очистка и улучшение запроса
         processed_query = self.enhance_query(query)
         
+        # Результат зависит только от обработанного запроса, статьи и состояния индекса
+        cache_key = (processed_query, arxiv_id, self.embedding_manager.index_version)
+        cached_result = self._results_cache.get(cache_key)
+        if cached_result is not None:
+            logger.info("Результат запроса взят из кэша")
+            return dict(cached_result, query=query)
+        
         # Поиск релевантного чанка
         top_chunk = self._search_relevant_chunk(processed_query, arxiv_id)
         
@@ -83,6 +113,9 @@ class QueryProcessor:
             'context': self._extract_context(top_chunk)
         }
         
+        # Неудачные поиски не кэшируются, чтобы не занимать место
+        self._results_cache.set(cache_key, dict(result))
+        
         logger.info(f"Найден релевантный чанк с оценкой {top_chunk['score']:.3f}, получено {len(section_chunks)} чанков из секции")
         return result
     
@@ -96,29 +129,18 @@ class QueryProcessor:
         Returns:
             Улучшенный запрос
         """
-        # Приводим к нижнему регистру
-        enhanced = query.lower().strip()
-        
-        # Удаляем лишние символы
-        enhanced = re.sub(r'[^\w\s]', ' ', enhanced)
-        enhanced = re.sub(r'\s+', ' ', enhanced)
-        
-        # Расширяем запрос синонимами
-        words = enhanced.split()
-        expanded_words = []
-        
-        for word in words:
-            expanded_words.append(word)
-            if word in self.query_expansions:
-                expanded_words.extend(self.query_expansions[word])
-        
-        # Удаляем стоп-слова (кроме важных для контекста)
-        filtered_words = []
-        for word in expanded_words:
-            if word not in self.stop_words or len(word) > 3:
-                filtered_words.append(word)
-        
-        enhanced = ' '.join(filtered_words)
+        # Приводим к нижнему регистру и удаляем лишние символы
+        words = _NONWORD_RE.sub(' ', query.lower()).split()
+        
+        # Расширяем запрос синонимами и удаляем стоп-слова (кроме важных для контекста)
+        expansions = self.query_expansions
+        stop_words = self.stop_words
+        enhanced = ' '.join([
+            expanded
+            for word in words
+            for expanded in (word, *expansions.get(word, ()))
+            if expanded not in stop_words or len(expanded) > 3
+        ])
         
         logger.debug(f"Запрос улучшен: '{query}' -> '{enhanced}'")
         return enhanced
@@ -134,27 +156,13 @@ class QueryProcessor:
         Returns:
             Наиболее релевантный чанк или None
         """
-        # Этап 1: BM25 поиск для получения кандидатов
-        bm25_candidates = self.embedding_manager.bm25_search(query, k=10)
+        # Этап 1: BM25 поиск кандидатов (сразу в пределах статьи, если указана)
+        bm25_candidates = self.embedding_manager.bm25_search(query, k=10, arxiv_id=arxiv_id)
         
         if not bm25_candidates:
             logger.warning("BM25 поиск не дал результатов, используем только эмбеддинги")
             return self._fallback_embedding_search(query, arxiv_id)
         
-        # Фильтруем BM25 кандидатов по arxiv_id если нужно
-        if arxiv_id:
-            filtered_candidates = []
-            for candidate in bm25_candidates:
-                chunk_arxiv_id = candidate.get('metadata', {}).get('arxiv_id')
-                if chunk_arxiv_id == arxiv_id:
-                    filtered_candidates.append(candidate)
-            
-            if not filtered_candidates:
-                logger.warning(f"BM25 не нашел чанков для статьи {arxiv_id}, используем эмбеддинги")
-                return self._fallback_embedding_search(query, arxiv_id)
-            
-            bm25_candidates = filtered_candidates
-        
         # Этап 2: Семантическое ранжирование BM25 кандидатов
         best_candidate = self._rerank_with_embeddings(query, bm25_candidates)
         
@@ -169,28 +177,16 @@ class QueryProcessor:
         """
         Fallback поиск только по эмбеддингам
         """
-        k = 10 if arxiv_id else 5
-        results = self.embedding_manager.search(query, k=k)
+        results = self.embedding_manager.search(query, k=1, arxiv_id=arxiv_id)
+        
+        if not results and arxiv_id:
+            logger.warning(f"Не найдено чанков для статьи {arxiv_id}")
+            # Возвращаем лучший результат в целом
+            results = self.embedding_manager.search(query, k=1)
         
         if not results:
             return None
         
-        # Фильтруем по arxiv_id если указан
-        if arxiv_id:
-            filtered_results = []
-            for result in results:
-                chunk_arxiv_id = result.get('metadata', {}).get('arxiv_id')
-                if chunk_arxiv_id == arxiv_id:
-                    filtered_results.append(result)
-            
-            if filtered_results:
-                results = filtered_results
-            else:
-                logger.warning(f"Не найдено чанков для статьи {arxiv_id}")
-                best_result = results[0]  # Возвращаем лучший результат в целом
-                best_result['debug_bm25_candidates'] = []
-                return best_result
-        
         best_result = results[0]
         best_result['debug_bm25_candidates'] = []
         return best_result
@@ -210,39 +206,28 @@ class QueryProcessor:
             return None
         
         try:
-            # Получаем эмбеддинг запроса
-            query_embedding = self.embedding_manager.model.encode([query], convert_to_numpy=True)
-            
-            # Нормализуем
-            import faiss
-            faiss.normalize_L2(query_embedding)
+            # Эмбеддинг запроса берем из кэша, эмбеддинги кандидатов - из FAISS индекса
+            query_embedding = self.embedding_manager.encode_query(query)
+            candidate_embeddings = self.embedding_manager.get_embeddings(
+                [candidate['id'] for candidate in candidates]
+            )
             
-            best_candidate = None
-            best_score = -1
+            # Косинусное сходство запроса со всеми кандидатами одним умножением
+            similarities = candidate_embeddings @ query_embedding
             
-            # Переранжируем каждого кандидата
-            for candidate in candidates:
-                # Получаем эмбеддинг кандидата
-                candidate_text = candidate['text']
-                candidate_embedding = self.embedding_manager.model.encode([candidate_text], convert_to_numpy=True)
-                faiss.normalize_L2(candidate_embedding)
-                
-                # Вычисляем косинусное сходство
-                similarity = float(query_embedding @ candidate_embedding.T)
-                
-                # Комбинируем BM25 score и semantic score (соотношение 3:7)
-                bm25_score = candidate.get('score', 0)
-                combined_score = self.BM25_WEIGHT * bm25_score + self.SEMANTIC_WEIGHT * similarity
-                
-                if combined_score > best_score:
-                    best_score = combined_score
-                    best_candidate = candidate.copy()
-                    best_candidate['score'] = combined_score
-                    best_candidate['bm25_score'] = bm25_score
-                    best_candidate['semantic_score'] = similarity
-                    best_candidate['search_type'] = 'hybrid'
+            # Комбинируем BM25 score и semantic score (соотношение 3:7)
+            bm25_scores = np.array([candidate.get('score', 0) for candidate in candidates], dtype=np.float32)
+            combined_scores = self.BM25_WEIGHT * bm25_scores + self.SEMANTIC_WEIGHT * similarities
             
-            return best_candidate
+            # Результат собирается один раз, только для победившего кандидата
+            best_idx = int(np.argmax(combined_scores))
+            return {
+                **candidates[best_idx],
+                'score': float(combined_scores[best_idx]),
+                'bm25_score': float(bm25_scores[best_idx]),
+                'semantic_score': float(similarities[best_idx]),
+                'search_type': 'hybrid'
+            }
             
         except Exception as e:
             logger.error(f"Ошибка переранжирования: {e}")
@@ -269,12 +254,8 @@ class QueryProcessor:
             'source_method': metadata.get('extraction_method', 'unknown')
         }
         
-        # Краткая выжимка из текста (первые 200 символов)
-        text = chunk['text']
-        if len(text) > 200:
-            context['preview'] = text[:200] + "..."
-        else:
-            context['preview'] = text
+        # Краткая выжимка из текста (посчитана при индексации)
+        context['preview'] = metadata.get('preview') or make_preview(chunk['text'])
         
         return context
     
@@ -292,17 +273,8 @@ class QueryProcessor:
         """
         logger.info(f"Поиск '{query}' в статье {arxiv_id}")
         
-        # Получаем больше результатов для фильтрации
-        all_results = self.embedding_manager.search(query, k=k*3)
-        
-        # Фильтруем по статье
-        article_results = []
-        for result in all_results:
-            chunk_arxiv_id = result.get('metadata', {}).get('arxiv_id')
-            if chunk_arxiv_id == arxiv_id:
-                article_results.append(result)
-                if len(article_results) >= k:
-                    break
+        # Поиск ограничивается чанками статьи внутри FAISS
+        article_results = self.embedding_manager.search(query, k=k, arxiv_id=arxiv_id)
         
         logger.info(f"Найдено {len(article_results)} результатов в статье {arxiv_id}")
         return article_results
@@ -317,27 +289,23 @@ class QueryProcessor:
         Returns:
             Список важных чанков
         """
-        summary_queries = [
-            "abstract introduction summary",
-            "conclusion results findings",
-            "methodology methods approach"
-        ]
-        
         summary_chunks = []
         seen_chunks = set()
         
-        for query in summary_queries:
-            results = self.search_in_article(query, arxiv_id, k=2)
+        # Все запросы изложения отправляются в FAISS одной матрицей
+        results_per_query = self.embedding_manager.batch_search(
+            list(self.SUMMARY_QUERIES), k=2, arxiv_id=arxiv_id
+        )
+        
+        for results in results_per_query:
             for result in results:
                 chunk_id = result.get('chunk_id')
                 if chunk_id not in seen_chunks:
                     summary_chunks.append(result)
                     seen_chunks.add(chunk_id)
         
-        # Сортируем по релевантности
-        summary_chunks.sort(key=lambda x: x['score'], reverse=True)
-        
-        return summary_chunks[:5]  # Возвращаем топ-5
+        # Возвращаем топ-5 по релевантности без полной сортировки
+        return heapq.nlargest(5, summary_chunks, key=lambda x: x['score'])
     
     def _get_section_chunks(self, top_chunk: Dict, arxiv_id: str) -> List[Dict]:
         """
@@ -359,25 +327,13 @@ class QueryProcessor:
         
         logger.info(f"Ищем все чанки секции '{section_name}' в статье {arxiv_id}")
         
-        # Получаем все чанки статьи через поиск с широким запросом
-        all_article_chunks = self._get_all_article_chunks(arxiv_id)
+        # Берем чанки секции напрямую из обратного индекса
+        section_chunks = self.embedding_manager.get_section_chunks(arxiv_id, section_name)
         
-        if not all_article_chunks:
-            logger.warning(f"Не найдено чанков для статьи {arxiv_id}")
+        if not section_chunks:
+            logger.warning(f"Не найдено чанков секции '{section_name}' для статьи {arxiv_id}")
             return [top_chunk]
         
-        # Фильтруем по секции
-        section_chunks = []
-        for chunk in all_article_chunks:
-            chunk_metadata = chunk.get('metadata', {})
-            chunk_section = chunk_metadata.get('section')
-            
-            if chunk_section == section_name:
-                section_chunks.append(chunk)
-        
-        # Сортируем по порядку в документе (chunk_index)
-        section_chunks.sort(key=lambda x: x.get('metadata', {}).get('chunk_index', 0))
-        
         logger.info(f"Найдено {len(section_chunks)} чанков в секции '{section_name}'")
         return section_chunks
     
@@ -391,36 +347,7 @@ class QueryProcessor:
         Returns:
             Список всех чанков статьи
         """
-        # Используем широкий поиск для получения всех чанков статьи
-        # Поищем по общим терминам, которые должны быть в любой научной статье
-        broad_queries = [
-            "abstract introduction method result conclusion",
-            "research study analysis data experiment",
-            "paper article work approach model",
-            "figure table equation reference"
-        ]
-        
-        all_chunks = []
-        seen_chunk_ids = set()
-        
-        for query in broad_queries:
-            # Получаем много результатов для широкого покрытия
-            results = self.embedding_manager.search(query, k=50)
-            
-            for result in results:
-                chunk_arxiv_id = result.get('metadata', {}).get('arxiv_id')
-                chunk_index = result.get('metadata', {}).get('chunk_index')
-                
-                # Проверяем, что это нужная статья и мы еще не видели этот чанк
-                if (chunk_arxiv_id == arxiv_id and 
-                    chunk_index is not None and 
-                    chunk_index not in seen_chunk_ids):
-                    
-                    all_chunks.append(result)
-                    seen_chunk_ids.add(chunk_index)
-        
-        # Сортируем по порядку в документе
-        all_chunks.sort(key=lambda x: x.get('metadata', {}).get('chunk_index', 0))
+        all_chunks = self.embedding_manager.get_chunks_by_arxiv(arxiv_id)
         
         logger.debug(f"Получено {len(all_chunks)} уникальных чанков для статьи {arxiv_id}")
         return all_chunks
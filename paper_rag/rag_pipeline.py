@@ -1,6 +1,7 @@
 """
 Основной RAG пайплайн для работы с научными статьями
 """
+import io
 import os
 import logging
 from typing import Dict, List, Optional
@@ -214,29 +215,38 @@ class RAGPipeline:
         # Заголовок с информацией о секции
         answer_parts.append(f"**Ответ из раздела '{section}' (полный контекст секции):**")
         
-        # Объединяем тексты всех чанков секции в правильном порядке
-        section_text_parts = []
-        for chunk in section_chunks:
-            text = chunk['text'].strip()
-            if text and text not in section_text_parts:  # Избегаем дублирования
-                section_text_parts.append(text)
+        # Объединяем тексты всех чанков секции в правильном порядке,
+        # избегая дублирования (dict сохраняет порядок вставки)
+        section_text_parts = dict.fromkeys(chunk['text'].strip() for chunk in section_chunks)
+        section_text_parts.pop('', None)
         
-        # Объединяем тексты
-        full_section_text = " ".join(section_text_parts)
+        # Длина объединенного через пробел текста, без его построения
+        total_length = sum(map(len, section_text_parts)) + max(len(section_text_parts) - 1, 0)
         
         # Если текст очень длинный, ограничиваем его
         max_length = 4000  # Максимальная длина для LLM
-        if len(full_section_text) > max_length:
+        if total_length > max_length:
             top_chunk_text = top_chunk['text']
             remaining_length = max_length - len(top_chunk_text) - 100
             
             if remaining_length > 0:
-                truncated_text = full_section_text[:remaining_length] + "..."
+                # Пишем только нужное начало секции, не склеивая ее целиком
+                prefix = io.StringIO()
+                for i, text in enumerate(section_text_parts):
+                    if prefix.tell() >= remaining_length:
+                        break
+                    if i:
+                        prefix.write(" ")
+                    prefix.write(text[:remaining_length - prefix.tell()])
+                
+                truncated_text = prefix.getvalue() + "..."
                 full_section_text = truncated_text + "\n\n[MOST RELEVANT PART]\n" + top_chunk_text
             else:
                 full_section_text = top_chunk_text
             
             answer_parts.append(f"*Примечание: Текст секции сокращен. Показано {len(section_chunks)} чанков.*")
+        else:
+            full_section_text = " ".join(section_text_parts)
         
         answer_parts.append(full_section_text)
         
@@ -302,13 +312,15 @@ class RAGPipeline:
         try:
             stats = self.embedding_manager.get_index_stats()
             
+            # Модель эмбеддингов загружается лениво при первом запросе,
+            # поэтому готовность определяется наличием индекса
             status = {
-                'rag_ready': stats['model_loaded'] and stats['index_exists'],
+                'rag_ready': stats['index_exists'],
                 'components': {
                     'pdf_processor': True,  # Всегда готов
                     'text_chunker': True,   # Всегда готов
-                    'embedding_manager': stats['model_loaded'],
-                    'query_processor': stats['model_loaded']
+                    'embedding_manager': stats['index_exists'],
+                    'query_processor': stats['index_exists']
                 },
                 'index_stats': stats,
                 'data_directories': {
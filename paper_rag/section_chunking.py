@@ -3,15 +3,288 @@
 """
 
 import re
-from typing import List, Dict, Optional, Tuple
+import sys
+import functools
+import bisect
+import threading
+from concurrent.futures import ProcessPoolExecutor
+from dataclasses import dataclass, field
+from typing import List, Dict, Iterator, Optional, Tuple
 import logging
 from pathlib import Path
 
-from langchain_text_splitters import RecursiveCharacterTextSplitter
-from .visual_chunking import visual_header_detector
+
+try:
+    import hyperscan
+except ImportError:
+    hyperscan = None
+
+try:
+    import ahocorasick
+except ImportError:
+    ahocorasick = None
 
 logger = logging.getLogger(__name__)
 
+# Последовательности пробельных символов
+_WS_RE = re.compile(r'\s+')
+
+# Словесные токены
+_TOKEN_RE = re.compile(r'\w+')
+
+# Допустимое превышение max_section_size, при котором раздел не разбивается:
+# иначе от него отрезается крошечный хвостовой чанк
+SPLIT_TOLERANCE = 1.1
+
+# Три и более переноса строки подряд (с пробелами между ними)
+_BLANK_RE = re.compile(r'\n\s*\n\s*\n')
+
+# Математические символы, по которым отбрасываются формулы
+_MATH_RE = re.compile(r'[=≤≥±∞∑∏∫]')
+
+# Номер раздела, за которым идет текст ("1 Introduction", "2.1. Methods")
+_NUMBERED_TITLE_RE = re.compile(r'\d+(\.\d+)*[\.\s]*[A-Za-z]')
+
+# Одна буква + пробел (приложения: "E Additional Details")
+_LETTER_TITLE_RE = re.compile(r'[A-Z]\s+[A-Za-z]')
+
+# Приложение с буквой ("Appendix A")
+_APPENDIX_TITLE_RE = re.compile(r'Appendix\s+[A-Z]', re.IGNORECASE)
+
+# Номера разделов по уровням вложенности
+_LEVEL0_NUMBER_RE = re.compile(r'\d+\s+')
+_LEVEL1_NUMBER_RE = re.compile(r'\d+\.\d+\s+')
+_LEVEL2_NUMBER_RE = re.compile(r'\d+\.\d+\.\d+\s+')
+
+# Номера разделов в визуальных заголовках
+_TOP_NUMBER_RE = re.compile(r'\d+[\.\s]')
+_SUB_NUMBER_RE = re.compile(r'\d+\.\d+')
+
+# Стандартные разделы статьи
+_STANDARD_SECTIONS = frozenset({
+    'Abstract', 'ABSTRACT',
+    'Introduction', 'INTRODUCTION', 
+    'Related Work', 'RELATED WORK',
+    'Background', 'BACKGROUND',
+    'Methods', 'METHODS', 'Methodology', 'METHODOLOGY',
+    'Results', 'RESULTS',
+    'Discussion', 'DISCUSSION',
+    'Conclusion', 'CONCLUSION', 'Conclusions', 'CONCLUSIONS',
+    'Acknowledgments', 'ACKNOWLEDGMENTS', 'Acknowledgements', 'ACKNOWLEDGEMENTS',
+    'References', 'REFERENCES',
+    'Bibliography', 'BIBLIOGRAPHY',
+    'Appendix', 'APPENDIX'
+})
+
+# Основные разделы статьи (ищутся как подстрока заголовка)
+_MAIN_SECTION_RE = re.compile('|'.join(re.escape(section) for section in (
+    'Abstract', 'Introduction', 'Related work', 'Methods', 'Methodology',
+    'Results', 'Discussion', 'Conclusion', 'Conclusions', 'References'
+)))
+
+# Стандартные разделы статьи (точные совпадения)
+STANDARD_SECTION_PATTERNS = (
+    r'Abstract|ABSTRACT',
+    r'Introduction|INTRODUCTION',
+    r'Related [Ww]ork|RELATED WORK',
+    r'Background|BACKGROUND',
+    r'Methods?|METHODS?|Methodology|METHODOLOGY',
+    r'Results?|RESULTS?',
+    r'Discussion|DISCUSSION',
+    r'Conclusions?|CONCLUSIONS?',
+    r'Acknowledgments?|ACKNOWLEDGMENTS?|Acknowledgements|ACKNOWLEDGEMENTS',
+    r'References?|REFERENCES?|Bibliography|BIBLIOGRAPHY',
+    r'Appendix|APPENDIX',
+    r'Appendix [A-Z]|APPENDIX [A-Z]',  # "Appendix A", "Appendix B"
+)
+
+# Паттерны названий заголовков (строгие критерии). Каждый ищется в строке вида
+# "\n<отступ><название><пробелы>\n"
+HEADER_TITLE_PATTERNS = (
+    # 1. Нумерованные разделы (начинаются с цифры)
+    r'\d+\.?\s+[A-Za-z][^.\n]{2,60}',  # "1 Introduction", "2 Methods"
+    r'\d+\.\d+\.?\s+[A-Za-z][^.\n]{2,60}',  # "2.1 Data Collection"
+    r'\d+\.\d+\.\d+\.?\s+[A-Za-z][^.\n]{2,60}',  # "2.1.1 Details"
+    
+    # 2. Разделы начинающиеся с буквы + пробел (приложения)
+    r'[A-Z]\s+[A-Za-z][^.\n]{2,60}',  # "A Additional Details", "B Experiments"
+    
+    # 3. Стандартные разделы статьи - одной альтернативой (порядок сохранен)
+    '|'.join(f'(?:{pattern})' for pattern in STANDARD_SECTION_PATTERNS),
+)
+
+# Номер объединенного паттерна стандартных разделов
+_STANDARD_PATTERN_IDX = len(HEADER_TITLE_PATTERNS) - 1
+
+_STANDARD_SECTION_RES = tuple(re.compile(pattern) for pattern in STANDARD_SECTION_PATTERNS)
+
+# Все паттерны в одном выражении: группа t<i> - название, e<i> - хвост строки.
+# Хвост проверяется через lookahead, чтобы завершающий перенос строки
+# оставался доступен для следующего заголовка
+_HEADER_RE = re.compile(
+    r'\n\s*(?:' + '|'.join(
+        rf'(?P<t{i}>{pattern})(?=(?P<e{i}>\s*\n))'
+        for i, pattern in enumerate(HEADER_TITLE_PATTERNS)
+    ) + ')'
+)
+
+def _build_header_hyperscan_db():
+    """
+    Компиляция паттернов заголовков в базу Hyperscan (если библиотека установлена)
+    
+    Returns:
+        База Hyperscan или None
+    """
+    if hyperscan is None:
+        return None
+    
+    # Hyperscan используется как префильтр, поэтому паттерны можно ослабить:
+    # в Python \s для str включает также \x1c-\x1f, а ограничение длины {2,60}
+    # слишком дорого для отслеживания начала совпадения (проверит re)
+    expressions = [
+        (r'\n\s*(?:' + pattern + r')\s*\n')
+        .replace(r'\s', r'[\s\x1c-\x1f]')
+        .replace('{2,60}', '{2,}')
+        .encode()
+        for pattern in HEADER_TITLE_PATTERNS
+    ]
+    
+    try:
+        db = hyperscan.Database()
+        db.compile(
+            expressions=expressions,
+            ids=list(range(len(expressions))),
+            elements=len(expressions),
+            flags=[hyperscan.HS_FLAG_SOM_LEFTMOST] * len(expressions)
+        )
+        return db
+    except Exception as e:
+        logger.warning(f"Не удалось скомпилировать паттерны заголовков в Hyperscan: {e}")
+        return None
+
+_HEADER_HS_DB = _build_header_hyperscan_db()
+
+# Scratch-память Hyperscan нельзя делить между потоками
+_hs_local = threading.local()
+
+@functools.lru_cache(maxsize=256)
+def _standard_section_index(title: str) -> int:
+    """
+    Номер паттерна стандартного раздела, которому соответствует название
+    (первый подходящий - тот же, что выбрала альтернатива в _HEADER_RE)
+    
+    Args:
+        title: Название, совпавшее с объединенным паттерном
+        
+    Returns:
+        Индекс в STANDARD_SECTION_PATTERNS
+    """
+    for idx, section_re in enumerate(_STANDARD_SECTION_RES):
+        if section_re.fullmatch(title):
+            return idx
+    return 0
+
+# Названия вроде "Introduction" повторяются внутри статьи и между статьями,
+# поэтому результаты проверок кэшируются
+@functools.lru_cache(maxsize=8192)
+def _is_valid_title(title: str) -> bool:
+    """
+    Проверка валидности заголовка по строгим критериям:
+    1. Начинается с цифры (1 Introduction, 2.1 Methods)
+    2. Начинается с буквы + пробел (E Additional Details)
+    3. Стандартные разделы (Abstract, Acknowledgments, References)
+    
+    Args:
+        title: Заголовок для проверки
+    
+    Returns:
+        True если заголовок валидный
+    """
+    title = title.strip()
+    
+    # Базовые фильтры
+    if len(title) < 3 or len(title) > 100:
+        return False
+    
+    # Исключаем URL и email
+    if '@' in title or 'http' in title.lower():
+        return False
+    
+    # Исключаем математические выражения
+    if _MATH_RE.search(title):
+        return False
+    
+    # СТРОГИЕ КРИТЕРИИ:
+    
+    # 1. Начинается с цифры (нумерованные разделы) и имеет текст после числа
+    if _NUMBERED_TITLE_RE.match(title):
+        return True
+    
+    # 2. Начинается с одной буквы + пробел (приложения)
+    if _LETTER_TITLE_RE.match(title):
+        return True
+    
+    # 3. Точное совпадение со стандартными разделами статьи
+    if title in _STANDARD_SECTIONS:
+        return True
+    
+    # Appendix с буквой (Appendix A, Appendix B)
+    if _APPENDIX_TITLE_RE.match(title):
+        return True
+    
+    # Все остальное отклоняем
+    return False
+
+@functools.lru_cache(maxsize=8192)
+def _title_level(title: str) -> int:
+    """
+    Определение уровня заголовка
+    
+    Args:
+        title: Заголовок
+    
+    Returns:
+        Уровень заголовка (0 = основной, 1 = подраздел, и т.д.)
+    """
+    # Основные разделы статьи
+    if _MAIN_SECTION_RE.search(title):
+        return 0
+    
+    # Нумерованные разделы
+    if _LEVEL0_NUMBER_RE.match(title):  # "1 Introduction"
+        return 0
+    
+    if _LEVEL1_NUMBER_RE.match(title):  # "2.1 Methods"
+        return 1
+    
+    if _LEVEL2_NUMBER_RE.match(title):  # "2.1.1 Details"
+        return 2
+    
+    # По умолчанию
+    return 1
+
+@dataclass
+class Header:
+    """
+    Найденный заголовок раздела
+    """
+    title: str
+    start_pos: int
+    end_pos: int
+    match_start: int
+    match_end: int
+    level: int
+    # Визуальные характеристики (есть только у заголовков из PDF)
+    is_visual: bool = False
+    font_size: float = 0
+    is_bold: bool = False
+    score: float = 0.0
+    # Название в нижнем регистре для сравнения заголовков (вычисляется один раз)
+    title_lower: str = field(init=False)
+    
+    def __post_init__(self):
+        self.title_lower = sys.intern(self.title.lower())
+
 class SectionBasedChunker:
     """
     Класс для разбиения текста на чанки по разделам статьи
@@ -19,20 +292,55 @@ class SectionBasedChunker:
     
     def __init__(self, 
                  max_section_size: int = 1000,
-                 chunk_overlap: int = 200):
+                 chunk_overlap: int = 200,
+                 min_section_size: int = 100):
         """
         Инициализация чанкера
         
         Args:
             max_section_size: Максимальный размер раздела в символах
             chunk_overlap: Перекрытие для больших разделов
+            min_section_size: Чанки короче этого размера сливаются со следующим
         """
         self.max_section_size = max_section_size
         self.chunk_overlap = chunk_overlap
+        self.min_section_size = min_section_size
+        
+        # Сплиттер создается при первом разбиении большого раздела
+        self._text_splitter = None
+        self._text_splitter_loaded = False
+        self._text_splitter_lock = threading.Lock()
+    
+    @property
+    def text_splitter(self):
+        """
+        RecursiveCharacterTextSplitter, создаваемый при первом использовании
+        (None, если langchain_text_splitters недоступен)
+        """
+        if not self._text_splitter_loaded:
+            with self._text_splitter_lock:
+                if not self._text_splitter_loaded:
+                    self._text_splitter = self._initialize_text_splitter()
+                    self._text_splitter_loaded = True
+        return self._text_splitter
+    
+    def _initialize_text_splitter(self):
+        """
+        Создание сплиттера для больших разделов
         
-        self.text_splitter = RecursiveCharacterTextSplitter(
-                chunk_size=max_section_size,
-                chunk_overlap=chunk_overlap,
+        Returns:
+            RecursiveCharacterTextSplitter или None, если библиотека недоступна
+        """
+        # Импорт здесь: langchain тянет тяжелые зависимости, а для extract_sections он не нужен
+        try:
+            from langchain_text_splitters import RecursiveCharacterTextSplitter
+        except ImportError as e:
+            logger.warning(f"langchain_text_splitters недоступен, используется простое разбиение: {e}")
+            return None
+        
+        return RecursiveCharacterTextSplitter(
+                chunk_size=self.max_section_size,
+                chunk_overlap=self.chunk_overlap,
                 separators=["\n\n", "\n", ". ", " ", ""]
             )
     
@@ -61,8 +369,12 @@ class SectionBasedChunker:
                 headers = self._combine_headers(headers, regex_headers, text)
                 logger.info(f"Комбинированный анализ: {len(headers)} заголовков")
         else:
-            # Используем старый метод с regex паттернами
-            headers = self._find_all_headers(text)
+            # Используем старый метод с regex паттернами: заголовки и разделы
+            # строятся за один проход по тексту
+            headers, sections = self._extract_sections_fused(text)
+            if headers:
+                logger.info(f"Найдено {len(sections)} разделов")
+                return sections
         
         if not headers:
             logger.warning("Заголовки не найдены, создаем один общий раздел")
@@ -82,7 +394,7 @@ class SectionBasedChunker:
         # Возвращаем только секции (чанки будут созданы в chunking.py)
         return sections
     
-    def _combine_headers(self, visual_headers: List[Dict], regex_headers: List[Dict], text: str) -> List[Dict]:
+    def _combine_headers(self, visual_headers: List[Header], regex_headers: List[Header], text: str) -> List[Header]:
         """
         Комбинирование визуальных и regex заголовков
         
@@ -94,51 +406,48 @@ class SectionBasedChunker:
         Returns:
             Объединенный список заголовков
         """
-        combined = []
-        
         # Добавляем все визуальные заголовки
-        for vh in visual_headers:
-            combined.append(vh)
+        combined = list(visual_headers)
         
-        # Добавляем regex заголовки, которых нет среди визуальных
-        visual_titles = {h['title'].lower() for h in visual_headers}
+        # Добавляем regex заголовки, которых нет среди визуальных.
+        # Для каждого названия запоминаем позицию его первого визуального заголовка
+        visual_title_positions = {}
+        for vh in visual_headers:
+            visual_title_positions.setdefault(vh.title_lower, vh.start_pos)
         
         for rh in regex_headers:
-            title_lower = rh['title'].lower()
-            
-            # Проверяем, нет ли уже похожего заголовка
-            is_duplicate = False
-            for vt in visual_titles:
-                if (title_lower == vt or 
-                    title_lower in vt or 
-                    vt in title_lower or
-                    abs(rh['start_pos'] - next((vh['start_pos'] for vh in visual_headers if vh['title'].lower() == vt), -1000)) < 100):
-                    is_duplicate = True
-                    break
+            title_lower = rh.title_lower
+            
+            # Проверяем, нет ли уже похожего заголовка: сначала точное совпадение
+            # названия, затем вхождение названий друг в друга и близость позиций
+            is_duplicate = title_lower in visual_title_positions
+            if not is_duplicate:
+                for vt, vt_pos in visual_title_positions.items():
+                    if (title_lower in vt or 
+                        vt in title_lower or
+                        abs(rh.start_pos - vt_pos) < 100):
+                        is_duplicate = True
+                        break
             
             if not is_duplicate:
                 combined.append(rh)
         
         # Сортируем по позиции в тексте
-        combined.sort(key=lambda x: x['start_pos'])
+        combined.sort(key=lambda x: x.start_pos)
         
-        # Удаляем дубликаты по позиции (если два заголовка очень близко)
+        # Удаляем дубликаты по позиции (если два заголовка очень близко).
+        # Оставшиеся заголовки отстоят друг от друга минимум на 50 символов,
+        # поэтому близким может быть только последний добавленный
         filtered = []
         for header in combined:
-            is_close_duplicate = False
-            for existing in filtered:
-                if abs(header['start_pos'] - existing['start_pos']) < 50:
-                    # Оставляем тот, который лучше (визуальный приоритетнее)
-                    if 'font_size' in header and 'font_size' not in existing:
-                        # Заменяем regex на visual
-                        filtered.remove(existing)
-                        break
-                    else:
-                        is_close_duplicate = True
-                        break
+            if filtered and header.start_pos - filtered[-1].start_pos < 50:
+                # Оставляем тот, который лучше (визуальный приоритетнее)
+                if header.is_visual and not filtered[-1].is_visual:
+                    # Заменяем regex на visual
+                    filtered[-1] = header
+                continue
             
-            if not is_close_duplicate:
-                filtered.append(header)
+            filtered.append(header)
         
         logger.info(f"Комбинирование заголовков: {len(visual_headers)} визуальных + {len(regex_headers)} regex = {len(filtered)} итого")
         return filtered
@@ -190,10 +499,55 @@ class SectionBasedChunker:
                 chunks.extend(sub_chunks)
                 chunk_index += len(sub_chunks)
         
+        chunks = self._postprocess_chunks(chunks)
+        
         logger.info(f"Создано {len(chunks)} чанков")
         return chunks
     
-    def _extract_visual_headers(self, text: str, pdf_path: str) -> List[Dict]:
+    def _postprocess_chunks(self, chunks: List[Dict]) -> List[Dict]:
+        """
+        Слияние крошечных чанков со следующими чанками того же раздела,
+        чтобы не тратить на них отдельные эмбеддинги
+        
+        Args:
+            chunks: Чанки в порядке документа
+            
+        Returns:
+            Чанки после слияния с перенумерованными индексами
+        """
+        if len(chunks) < 2:
+            return chunks
+        
+        # Граница та же, что и для неразбиваемых разделов, поэтому
+        # слитые чанки не нуждаются в повторном разбиении
+        merge_limit = self.max_section_size * SPLIT_TOLERANCE
+        
+        merged = []
+        for chunk in chunks:
+            prev = merged[-1] if merged else None
+            # Сливаем только в пределах раздела: иначе начало следующего раздела
+            # попало бы в индекс под чужим названием
+            if (prev is not None and
+                    prev['metadata'].get('section') == chunk['metadata'].get('section') and
+                    len(prev['text']) < self.min_section_size and
+                    len(prev['text']) + len(chunk['text']) + 2 <= merge_limit):
+                # Метаданные (позиция) остаются от первого чанка
+                prev['text'] = f"{prev['text']}\n\n{chunk['text']}"
+                continue
+            
+            merged.append(chunk)
+        
+        if len(merged) == len(chunks):
+            return chunks
+        
+        for chunk_index, chunk in enumerate(merged):
+            chunk['metadata']['chunk_index'] = chunk_index
+            chunk['chunk_id'] = f"{chunk['metadata']['arxiv_id']}_{chunk_index}"
+        
+        logger.info(f"Слито {len(chunks) - len(merged)} коротких чанков")
+        return merged
+    
+    def _extract_visual_headers(self, text: str, pdf_path: str) -> List[Header]:
         """
         Извлечение заголовков с использованием визуального анализа PDF
         
@@ -205,6 +559,9 @@ class SectionBasedChunker:
             Список заголовков найденных визуальным анализом
         """
         try:
+            # Импорт здесь: визуальный анализ загружает PDF-библиотеки (fitz, pdfplumber)
+            from .visual_chunking import visual_header_detector
+            
             # Получаем визуальные заголовки из PDF
             visual_headers = visual_header_detector.extract_visual_headers(pdf_path)
             
@@ -214,27 +571,39 @@ class SectionBasedChunker:
             # Сопоставляем визуальные заголовки с позициями в тексте
             matched_headers = []
             
-            for vh in visual_headers:
-                header_text = vh['text'].strip()
-                
+            # Точные совпадения всех заголовков ищем за один проход по тексту
+            header_texts = [vh['text'].strip() for vh in visual_headers]
+            exact_positions = self._find_exact_positions(text, header_texts)
+            
+            # Нормализованный текст строится один раз и только если понадобится
+            normalized = None
+            
+            for vh, header_text in zip(visual_headers, header_texts):
                 # Ищем этот текст в общем тексте статьи
-                text_position = self._find_text_position(text, header_text)
+                text_position = exact_positions.get(header_text)
+                if text_position is None:
+                    if normalized is None:
+                        normalized = self._normalize_whitespace(text)
+                    text_position = self._find_text_position(
+                        text, header_text, try_exact=False, normalized=normalized
+                    )
                 
                 if text_position is not None:
-                    matched_headers.append({
-                        'title': header_text,
-                        'start_pos': text_position,
-                        'end_pos': text_position + len(header_text),
-                        'match_start': text_position,
-                        'match_end': text_position + len(header_text),
-                        'level': self._determine_visual_header_level(vh),
-                        'font_size': vh.get('font_size', 0),
-                        'is_bold': vh.get('is_bold', False),
-                        'score': vh.get('score', 0)
-                    })
+                    matched_headers.append(Header(
+                        title=header_text,
+                        start_pos=text_position,
+                        end_pos=text_position + len(header_text),
+                        match_start=text_position,
+                        match_end=text_position + len(header_text),
+                        level=self._determine_visual_header_level(vh),
+                        is_visual=True,
+                        font_size=vh.get('font_size', 0),
+                        is_bold=vh.get('is_bold', False),
+                        score=vh.get('score', 0)
+                    ))
             
             # Сортируем по позиции в тексте
-            matched_headers.sort(key=lambda x: x['start_pos'])
+            matched_headers.sort(key=lambda x: x.start_pos)
             
             logger.info(f"Сопоставлено {len(matched_headers)} визуальных заголовков с текстом")
             return matched_headers
@@ -243,36 +612,118 @@ class SectionBasedChunker:
             logger.error(f"Ошибка визуального анализа заголовков: {e}")
             return []
     
-    def _find_text_position(self, text: str, header_text: str) -> Optional[int]:
+    def _find_exact_positions(self, text: str, header_texts: List[str]) -> Dict[str, int]:
+        """
+        Поиск первых точных вхождений заголовков в тексте
+        
+        Args:
+            text: Полный текст
+            header_texts: Тексты заголовков
+            
+        Returns:
+            Словарь заголовок -> позиция первого вхождения (только найденные)
+        """
+        titles = {title for title in header_texts if title}
+        positions = {}
+        
+        if ahocorasick is None or len(titles) < 2:
+            for title in titles:
+                pos = text.find(title)
+                if pos != -1:
+                    positions[title] = pos
+            return positions
+        
+        # Автомат Ахо-Корасик находит все заголовки за один проход по тексту
+        automaton = ahocorasick.Automaton()
+        for title in titles:
+            automaton.add_word(title, title)
+        automaton.make_automaton()
+        
+        for end_pos, title in automaton.iter(text):
+            if title not in positions:
+                positions[title] = end_pos - len(title) + 1
+                if len(positions) == len(titles):
+                    break
+        
+        return positions
+    
+    def _normalize_whitespace(self, text: str) -> Tuple[str, List[int], List[int]]:
+        """
+        Схлопывание пробельных последовательностей с картой смещений
+        
+        Args:
+            text: Полный текст
+            
+        Returns:
+            Нормализованный текст и параллельные списки начал фрагментов
+            в нормализованном и исходном тексте
+        """
+        parts = []
+        norm_starts = []
+        orig_starts = []
+        norm_pos = 0
+        orig_pos = 0
+        
+        for match in _WS_RE.finditer(text):
+            # Фрагмент без пробелов копируется как есть, пробелы - одним пробелом
+            for part, part_orig_start in ((text[orig_pos:match.start()], orig_pos), (' ', match.start())):
+                if part:
+                    parts.append(part)
+                    norm_starts.append(norm_pos)
+                    orig_starts.append(part_orig_start)
+                    norm_pos += len(part)
+            orig_pos = match.end()
+        
+        if orig_pos < len(text):
+            parts.append(text[orig_pos:])
+            norm_starts.append(norm_pos)
+            orig_starts.append(orig_pos)
+        
+        return ''.join(parts), norm_starts, orig_starts
+    
+    def _find_text_position(self, text: str, header_text: str, try_exact: bool = True,
+                            normalized: Optional[Tuple[str, List[int], List[int]]] = None) -> Optional[int]:
         """
         Поиск позиции заголовка в тексте
         
         Args:
             text: Полный текст
             header_text: Текст заголовка
+            try_exact: Проверять ли точное совпадение (False, если оно уже исключено)
+            normalized: Результат _normalize_whitespace(text), если уже посчитан
             
         Returns:
             Позиция заголовка в тексте или None
         """
         # Сначала точное совпадение
-        pos = text.find(header_text)
-        if pos != -1:
-            return pos
+        if try_exact:
+            pos = text.find(header_text)
+            if pos != -1:
+                return pos
         
         # Поиск с небольшими вариациями (убираем лишние пробелы, переносы)
-        normalized_header = re.sub(r'\s+', ' ', header_text.strip())
-        normalized_text = re.sub(r'\s+', ' ', text)
+        if normalized is None:
+            normalized = self._normalize_whitespace(text)
+        normalized_text, norm_starts, orig_starts = normalized
+        normalized_header = _WS_RE.sub(' ', header_text.strip())
         
         pos = normalized_text.find(normalized_header)
         if pos != -1:
-            # Переводим позицию обратно в оригинальный текст (приблизительно)
-            return pos
+            # Переводим позицию обратно в оригинальный текст по карте смещений
+            if not norm_starts:
+                return pos
+            part_idx = bisect.bisect_right(norm_starts, pos) - 1
+            return orig_starts[part_idx] + (pos - norm_starts[part_idx])
         
         # Поиск по словам (если заголовок состоит из нескольких слов)
         words = header_text.split()
         if len(words) > 1:
             # Ищем первое слово, затем проверяем что следующие слова идут рядом
             first_word = words[0]
+            # Токены остальных слов (пунктуация вроде "3." или ":" не учитывается)
+            remaining_words = frozenset(_TOKEN_RE.findall(' '.join(words[1:])))
+            # Окно проверки после первого слова (не длиннее 100 символов)
+            window = min(len(header_text) + 50, 100)
             start_pos = 0
             
             while True:
@@ -281,8 +732,8 @@ class SectionBasedChunker:
                     break
                 
                 # Проверяем, что после первого слова идут остальные
-                remaining_text = text[pos:pos + len(header_text) + 50]
-                if all(word in remaining_text[:100] for word in words[1:]):
+                tokens = _TOKEN_RE.findall(text, pos, pos + window)
+                if remaining_words.issubset(tokens):
                     return pos
                 
                 start_pos = pos + 1
@@ -313,13 +764,13 @@ class SectionBasedChunker:
             return 0
         
         # Нумерованные заголовки верхнего уровня
-        if re.match(r'^\d+[\.\s]', text) and not re.match(r'^\d+\.\d+', text):
+        if _TOP_NUMBER_RE.match(text) and not _SUB_NUMBER_RE.match(text):
             return 0
         
         # По умолчанию - подраздел
         return 1
     
-    def _find_all_headers(self, text: str) -> List[Dict]:
+    def _find_all_headers(self, text: str) -> List[Header]:
         """
         Поиск всех заголовков в тексте
         
@@ -329,63 +780,119 @@ class SectionBasedChunker:
         Returns:
             Список заголовков с позициями
         """
-        headers = []
-        
-        # Паттерны для поиска заголовков (строгие критерии)
-        header_patterns = [
-            # 1. Нумерованные разделы (начинаются с цифры)
-            r'\n\s*(\d+\.?\s+[A-Za-z][^.\n]{2,60})\s*\n',  # "1 Introduction", "2 Methods"
-            r'\n\s*(\d+\.\d+\.?\s+[A-Za-z][^.\n]{2,60})\s*\n',  # "2.1 Data Collection"
-            r'\n\s*(\d+\.\d+\.\d+\.?\s+[A-Za-z][^.\n]{2,60})\s*\n',  # "2.1.1 Details"
-            
-            # 2. Разделы начинающиеся с буквы + пробел (приложения)
-            r'\n\s*([A-Z]\s+[A-Za-z][^.\n]{2,60})\s*\n',  # "A Additional Details", "B Experiments"
-            
-            # 3. Стандартные разделы статьи (точные совпадения)
-            r'\n\s*(Abstract|ABSTRACT)\s*\n',
-            r'\n\s*(Introduction|INTRODUCTION)\s*\n', 
-            r'\n\s*(Related [Ww]ork|RELATED WORK)\s*\n',
-            r'\n\s*(Background|BACKGROUND)\s*\n',
-            r'\n\s*(Methods?|METHODS?|Methodology|METHODOLOGY)\s*\n',
-            r'\n\s*(Results?|RESULTS?)\s*\n',
-            r'\n\s*(Discussion|DISCUSSION)\s*\n',
-            r'\n\s*(Conclusions?|CONCLUSIONS?)\s*\n',
-            r'\n\s*(Acknowledgments?|ACKNOWLEDGMENTS?|Acknowledgements|ACKNOWLEDGEMENTS)\s*\n',
-            r'\n\s*(References?|REFERENCES?|Bibliography|BIBLIOGRAPHY)\s*\n',
-            r'\n\s*(Appendix|APPENDIX)\s*\n',
-            r'\n\s*(Appendix [A-Z]|APPENDIX [A-Z])\s*\n',  # "Appendix A", "Appendix B"
-        ]
-        
-        for pattern in header_patterns:
-            matches = re.finditer(pattern, text, re.MULTILINE)
-            for match in matches:
-                title = match.group(1).strip()
-                
-                if self._is_valid_header(title):
-                    headers.append({
-                        'title': title,
-                        'start_pos': match.start(),
-                        'end_pos': match.end(),
-                        'match_start': match.start(1),
-                        'match_end': match.end(1),
-                        'level': self._determine_header_level(title)
-                    })
-        
-        # Сортируем заголовки по позиции
-        headers.sort(key=lambda x: x['start_pos'])
-        
-        # Удаляем дубликаты (заголовки с одинаковыми названиями в близких позициях)
-        headers = self._remove_duplicate_headers(headers)
+        headers = list(self._iter_headers(text))
         
         logger.info(f"Найдено {len(headers)} заголовков")
         return headers
     
+    def _iter_headers(self, text: str) -> Iterator[Header]:
+        """
+        Поиск заголовков в тексте по мере продвижения по нему
+        
+        Args:
+            text: Текст статьи
+            
+        Returns:
+            Итератор заголовков в порядке позиций, без дубликатов
+        """
+        # Следующая допустимая позиция для каждого паттерна: так же, как при
+        # отдельном re.finditer, совпадения одного паттерна не перекрываются.
+        # Стандартные разделы учитываются по своим исходным паттернам
+        next_allowed = [0] * (_STANDARD_PATTERN_IDX + len(STANDARD_SECTION_PATTERNS))
+        prev_header = None
+        
+        # Совпадения идут по возрастанию позиции, поэтому сортировка не нужна
+        for match in self._iter_header_matches(text):
+            # Номер сработавшего паттерна по имени его группы (t<i> / e<i>)
+            pattern_idx = int(match.lastgroup[1:])
+            title_group = f't{pattern_idx}'
+            
+            slot = pattern_idx
+            if pattern_idx == _STANDARD_PATTERN_IDX:
+                slot += _standard_section_index(match.group(title_group))
+            
+            if match.start() < next_allowed[slot]:
+                continue
+            
+            match_end = match.end(f'e{pattern_idx}')
+            next_allowed[slot] = match_end
+            title = match.group(title_group).strip()
+            
+            if not self._is_valid_header(title):
+                continue
+            
+            # Пропускаем дубликаты (то же название в близкой позиции)
+            if (prev_header and title == prev_header.title and
+                    match.start() - prev_header.start_pos < 100):
+                continue
+            
+            prev_header = Header(
+                title=title,
+                start_pos=match.start(),
+                end_pos=match_end,
+                match_start=match.start(title_group),
+                match_end=match.end(title_group),
+                level=self._determine_header_level(title)
+            )
+            yield prev_header
+    
+    def _iter_header_matches(self, text: str):
+        """
+        Перебор совпадений паттерна заголовков во всех позициях текста
+        
+        Args:
+            text: Текст статьи
+            
+        Yields:
+            Совпадения _HEADER_RE в порядке позиций
+        """
+        # Hyperscan за один SIMD-проход находит участки текста, где возможен
+        # заголовок; смещения в байтах совпадают с позициями символов только
+        # для ASCII текста
+        if _HEADER_HS_DB is not None and text.isascii():
+            spans = []
+            
+            def on_match(pattern_id, start, end, flags, context):
+                spans.append((start, end))
+            
+            scratch = getattr(_hs_local, 'scratch', None)
+            if scratch is None:
+                scratch = _hs_local.scratch = hyperscan.Scratch(_HEADER_HS_DB)
+            
+            _HEADER_HS_DB.scan(text.encode('ascii'), match_event_handler=on_match, scratch=scratch)
+            
+            # Объединяем пересекающиеся участки
+            merged = []
+            for start, end in sorted(spans):
+                if merged and start <= merged[-1][1]:
+                    merged[-1][1] = max(merged[-1][1], end)
+                else:
+                    merged.append([start, end])
+            
+            # Любое совпадение начинается с переноса строки - проверяем только их
+            for start, end in merged:
+                newline_pos = text.find('\n', start, end)
+                while newline_pos != -1:
+                    match = _HEADER_RE.match(text, newline_pos)
+                    if match:
+                        yield match
+                    newline_pos = text.find('\n', newline_pos + 1, end)
+            return
+        
+        pos = 0
+        while True:
+            match = _HEADER_RE.search(text, pos)
+            if not match:
+                break
+            yield match
+            
+            # Продолжаем со следующего символа: другие паттерны могут начинаться
+            # внутри только что найденного совпадения
+            pos = match.start() + 1
+    
     def _is_valid_header(self, title: str) -> bool:
         """
-        Проверка валидности заголовка по строгим критериям:
-        1. Начинается с цифры (1 Introduction, 2.1 Methods)
-        2. Начинается с буквы + пробел (E Additional Details)
-        3. Стандартные разделы (Abstract, Acknowledgments, References)
+        Проверка валидности заголовка (см. _is_valid_title)
         
         Args:
             title: Заголовок для проверки
@@ -393,63 +900,11 @@ class SectionBasedChunker:
         Returns:
             True если заголовок валидный
         """
-        title = title.strip()
-        
-        # Базовые фильтры
-        if len(title) < 3 or len(title) > 100:
-            return False
-        
-        # Исключаем URL и email
-        if '@' in title or 'http' in title.lower():
-            return False
-        
-        # Исключаем математические выражения
-        math_symbols = ['=', '≤', '≥', '±', '∞', '∑', '∏', '∫']
-        if any(symbol in title for symbol in math_symbols):
-            return False
-        
-        # СТРОГИЕ КРИТЕРИИ:
-        
-        # 1. Начинается с цифры (нумерованные разделы)
-        if re.match(r'^\d+', title):
-            # Должен иметь текст после числа (с точкой или без)
-            if re.match(r'^\d+(\.\d+)*[\.\s]*[A-Za-z]', title):
-                return True
-        
-        # 2. Начинается с одной буквы + пробел (приложения)
-        if re.match(r'^[A-Z]\s+[A-Za-z]', title):
-            return True
-        
-        # 3. Стандартные разделы статьи
-        standard_sections = [
-            'Abstract', 'ABSTRACT',
-            'Introduction', 'INTRODUCTION', 
-            'Related Work', 'RELATED WORK',
-            'Background', 'BACKGROUND',
-            'Methods', 'METHODS', 'Methodology', 'METHODOLOGY',
-            'Results', 'RESULTS',
-            'Discussion', 'DISCUSSION',
-            'Conclusion', 'CONCLUSION', 'Conclusions', 'CONCLUSIONS',
-            'Acknowledgments', 'ACKNOWLEDGMENTS', 'Acknowledgements', 'ACKNOWLEDGEMENTS',
-            'References', 'REFERENCES',
-            'Bibliography', 'BIBLIOGRAPHY',
-            'Appendix', 'APPENDIX'
-        ]
-        
-        # Точное совпадение со стандартными разделами
-        if title in standard_sections:
-            return True
-        
-        # Appendix с буквой (Appendix A, Appendix B)
-        if re.match(r'^Appendix\s+[A-Z]', title, re.IGNORECASE):
-            return True
-        
-        # Все остальное отклоняем
-        return False
+        return _is_valid_title(title)
     
     def _determine_header_level(self, title: str) -> int:
         """
-        Определение уровня заголовка
+        Определение уровня заголовка (см. _title_level)
         
         Args:
             title: Заголовок
@@ -457,56 +912,37 @@ class SectionBasedChunker:
         Returns:
             Уровень заголовка (0 = основной, 1 = подраздел, и т.д.)
         """
-        # Основные разделы статьи
-        main_sections = [
-            'Abstract', 'Introduction', 'Related work', 'Methods', 'Methodology',
-            'Results', 'Discussion', 'Conclusion', 'Conclusions', 'References'
-        ]
-        
-        if any(main in title for main in main_sections):
-            return 0
-        
-        # Нумерованные разделы
-        if re.match(r'^\d+\s+', title):  # "1 Introduction"
-            return 0
-        
-        if re.match(r'^\d+\.\d+\s+', title):  # "2.1 Methods"
-            return 1
-        
-        if re.match(r'^\d+\.\d+\.\d+\s+', title):  # "2.1.1 Details"
-            return 2
-        
-        # По умолчанию
-        return 1
+        return _title_level(title)
     
-    def _remove_duplicate_headers(self, headers: List[Dict]) -> List[Dict]:
+    def _extract_sections_fused(self, text: str) -> Tuple[List[Header], List[Dict]]:
         """
-        Удаление дублирующихся заголовков
+        Поиск regex заголовков и создание разделов за один проход по тексту:
+        раздел закрывается, как только найден следующий заголовок
         
         Args:
-            headers: Список заголовков
+            text: Полный текст
             
         Returns:
-            Список без дубликатов
+            Найденные заголовки и разделы на их основе
         """
-        if not headers:
-            return headers
+        headers = []
+        sections = []
+        blank_runs = self._find_blank_runs(text)
         
-        unique_headers = []
-        prev_header = None
+        for header in self._iter_headers(text):
+            if headers:
+                self._append_header_section(sections, text, headers[-1], header.start_pos, blank_runs)
+            else:
+                self._append_title_section(sections, text, header.start_pos)
+            headers.append(header)
         
-        for header in headers:
-            # Проверяем на дубликаты по названию и близкой позиции
-            if prev_header and header['title'] == prev_header['title']:
-                if abs(header['start_pos'] - prev_header['start_pos']) < 100:
-                    continue  # Пропускаем дубликат
-            
-            unique_headers.append(header)
-            prev_header = header
+        if headers:
+            self._append_header_section(sections, text, headers[-1], len(text), blank_runs)
         
-        return unique_headers
+        logger.info(f"Найдено {len(headers)} заголовков")
+        return headers, sections
     
-    def _create_sections_from_headers(self, text: str, headers: List[Dict]) -> List[Dict]:
+    def _create_sections_from_headers(self, text: str, headers: List[Header]) -> List[Dict]:
         """
         Создание разделов на основе найденных заголовков
         
@@ -518,46 +954,102 @@ class SectionBasedChunker:
             Список разделов
         """
         sections = []
+        blank_runs = self._find_blank_runs(text)
         
         # 1. Создаем секцию "Title" для текста до первой секции
-        if headers and headers[0]['start_pos'] > 0:
-            title_content = text[:headers[0]['start_pos']].strip()
+        if headers:
+            self._append_title_section(sections, text, headers[0].start_pos)
+        
+        # 2. Создаем секции для каждого заголовка.
+        # Начало секции = позиция заголовка, конец = начало следующего заголовка или конец текста
+        section_ends = [header.start_pos for header in headers[1:]]
+        section_ends.append(len(text))
+        
+        for header, section_end in zip(headers, section_ends):
+            self._append_header_section(sections, text, header, section_end, blank_runs)
+        
+        return sections
+    
+    def _find_blank_runs(self, text: str) -> Tuple[List[int], List[int]]:
+        """
+        Поиск всех пробельных блоков с тремя и более переносами строки за один проход
+        
+        Args:
+            text: Полный текст
+            
+        Returns:
+            Параллельные списки начал и концов блоков (по возрастанию)
+        """
+        run_starts = []
+        run_ends = []
+        for match in _BLANK_RE.finditer(text):
+            run_starts.append(match.start())
+            run_ends.append(match.end())
+        return run_starts, run_ends
+    
+    def _append_title_section(self, sections: List[Dict], text: str, first_header_pos: int):
+        """
+        Добавление секции "Title" для текста до первого заголовка
+        
+        Args:
+            sections: Список разделов, в который добавляется секция
+            text: Полный текст
+            first_header_pos: Позиция первого заголовка
+        """
+        if first_header_pos > 0:
+            title_content = text[:first_header_pos].strip()
             if title_content:
                 sections.append({
                     'title': 'Title',
                     'content': title_content,
                     'start_pos': 0,
-                    'end_pos': headers[0]['start_pos'],
+                    'end_pos': first_header_pos,
                     'level': 0
                 })
+    
+    def _append_header_section(self, sections: List[Dict], text: str, header: Header, section_end: int,
+                               blank_runs: Tuple[List[int], List[int]]):
+        """
+        Добавление секции заголовка
         
-        # 2. Создаем секции для каждого заголовка
-        for i, header in enumerate(headers):
-            # Начало секции = позиция заголовка
-            section_start = header['start_pos']
-            
-            # Конец секции = начало следующего заголовка или конец текста
-            if i + 1 < len(headers):
-                section_end = headers[i + 1]['start_pos']
-            else:
-                section_end = len(text)
-            
-            # Извлекаем содержимое секции (включая заголовок)
-            section_content = text[section_start:section_end].strip()
-            
-            # Убираем лишние пробелы и переносы
-            section_content = re.sub(r'\n\s*\n\s*\n', '\n\n', section_content)
-            
-            if section_content:
-                sections.append({
-                    'title': header['title'],
-                    'content': section_content,
-                    'start_pos': section_start,
-                    'end_pos': section_end,
-                    'level': header['level']
-                })
-        
-        return sections
+        Args:
+            sections: Список разделов, в который добавляется секция
+            text: Полный текст
+            header: Заголовок раздела
+            section_end: Конец раздела (начало следующего заголовка или конец текста)
+            blank_runs: Результат _find_blank_runs(text)
+        """
+        section_start = header.start_pos
+        
+        # Извлекаем содержимое секции (включая заголовок)
+        raw_content = text[section_start:section_end]
+        section_content = raw_content.strip()
+        
+        # Убираем лишние пробелы и переносы: блоки внутри секции уже найдены
+        # по всему тексту (блоки на краях секции срезаны strip)
+        content_start = section_start + len(raw_content) - len(raw_content.lstrip())
+        content_end = content_start + len(section_content)
+        run_starts, run_ends = blank_runs
+        run_idx = bisect.bisect_left(run_starts, content_start)
+        
+        if run_idx < len(run_starts) and run_ends[run_idx] <= content_end:
+            parts = []
+            pos = content_start
+            while run_idx < len(run_starts) and run_ends[run_idx] <= content_end:
+                parts.append(text[pos:run_starts[run_idx]])
+                pos = run_ends[run_idx]
+                run_idx += 1
+            parts.append(text[pos:content_end])
+            section_content = '\n\n'.join(parts)
+        
+        if section_content:
+            sections.append({
+                'title': header.title,
+                'content': section_content,
+                'start_pos': section_start,
+                'end_pos': section_end,
+                'level': header.level
+            })
     
     def _create_chunk(self, text: str, section_title: str, chunk_index: int, 
                      arxiv_id: str, section_start_pos: int = 0, 
@@ -606,20 +1098,52 @@ class SectionBasedChunker:
         Returns:
             Список подчанков
         """
+        # Раздел лишь немного больше лимита - оставляем одним чанком без вызова сплиттера
+        if len(section_content) <= self.max_section_size * SPLIT_TOLERANCE:
+            return [self._create_chunk(
+                text=section_content,
+                section_title=section_title,
+                chunk_index=start_chunk_index,
+                arxiv_id=arxiv_id,
+                section_start_pos=section_start_pos,
+                page_info=page_info
+            )]
+        
         if not self.text_splitter:
-            # Простое разбиение по размеру
+            # Разбиение по размеру с откатом к ближайшей границе абзаца, строки или предложения
             chunks = []
             chunk_size = self.max_section_size
+            content_length = len(section_content)
+            i = 0
             
-            for i in range(0, len(section_content), chunk_size - self.chunk_overlap):
-                chunk_text = section_content[i:i + chunk_size]
+            while i < content_length:
+                end = min(i + chunk_size, content_length)
+                
+                if end < content_length:
+                    # Самая поздняя граница в окне (позиция сразу после разделителя)
+                    boundary = max(
+                        section_content.rfind(separator, i, end) + len(separator)
+                        for separator in ('\n\n', '\n', '. ')
+                    )
+                    # Слишком ранняя граница дала бы мелкий чанк - режем по размеру
+                    if boundary - i > chunk_size * 0.5:
+                        end = boundary
+                
+                chunk_text = section_content[i:end]
+                chunk_start = i
+                
+                if end >= content_length:
+                    i = content_length
+                else:
+                    i = max(end - self.chunk_overlap, i + 1)
+                
                 if chunk_text.strip():
                     chunk = self._create_chunk(
                         text=chunk_text,
                         section_title=section_title,
                         chunk_index=start_chunk_index + len(chunks),
                         arxiv_id=arxiv_id,
-                        section_start_pos=section_start_pos + i,
+                        section_start_pos=section_start_pos + chunk_start,
                         page_info=page_info
                     )
                     chunks.append(chunk)
@@ -646,3 +1170,40 @@ class SectionBasedChunker:
 
 # Глобальный экземпляр чанкера
 section_chunker = SectionBasedChunker()
+
+def _chunk_one(paper: Tuple[str, str, Optional[str]]) -> List[Dict]:
+    """
+    Чанкинг одной статьи (выполняется в процессе-воркере)
+    
+    Args:
+        paper: Кортеж (текст, arxiv_id, путь к PDF или None)
+        
+    Returns:
+        Список чанков статьи
+    """
+    text, arxiv_id, pdf_path = paper
+    try:
+        sections = section_chunker.extract_sections(text, pdf_path)
+        return section_chunker.chunk_sections(sections, arxiv_id)
+    except Exception as e:
+        logger.error(f"Ошибка чанкинга статьи {arxiv_id}: {e}")
+        return []
+
+def chunk_papers_parallel(papers: List[Tuple[str, str, Optional[str]]],
+                          max_workers: Optional[int] = None) -> List[List[Dict]]:
+    """
+    Параллельный чанкинг нескольких статей в пуле процессов
+    (разбор regex и нарезка строк упираются в GIL)
+    
+    Args:
+        papers: Список кортежей (текст, arxiv_id, путь к PDF или None)
+        max_workers: Количество процессов (по умолчанию - число ядер)
+        
+    Returns:
+        Списки чанков в порядке входных статей
+    """
+    if len(papers) < 2:
+        return [_chunk_one(paper) for paper in papers]
+    
+    with ProcessPoolExecutor(max_workers=max_workers) as executor:
+        return list(executor.map(_chunk_one, papers, chunksize=4))
@@ -0,0 +1,85 @@
+"""
+Вспомогательные структуры данных для пайплайна
+"""
+
+import time
+import threading
+from collections import OrderedDict
+from typing import Any, Hashable, Optional
+
+
+class TTLCache:
+    """
+    Потокобезопасный LRU-кэш с ограничением времени жизни записей
+    """
+    
+    def __init__(self, max_items: int = 2048, ttl_sec: float = 300):
+        """
+        Инициализация кэша
+        
+        Args:
+            max_items: Максимальное количество записей (старые вытесняются первыми)
+            ttl_sec: Время жизни записи в секундах
+        """
+        self.max_items = max_items
+        self.ttl_sec = ttl_sec
+        self._items: "OrderedDict[Hashable, tuple]" = OrderedDict()
+        self._lock = threading.Lock()
+    
+    def get(self, key: Hashable) -> Optional[Any]:
+        """
+        Получение значения из кэша
+        
+        Args:
+            key: Ключ записи
+        
+        Returns:
+            Сохраненное значение или None, если записи нет или она устарела
+        """
+        with self._lock:
+            item = self._items.get(key)
+            if item is None:
+                return None
+            
+            expires_at, value = item
+            if expires_at < time.monotonic():
+                del self._items[key]
+                return None
+            
+            self._items.move_to_end(key)
+            return value
+    
+    def set(self, key: Hashable, value: Any):
+        """
+        Сохранение значения в кэш
+        
+        Args:
+            key: Ключ записи
+            value: Значение
+        """
+        with self._lock:
+            self._items[key] = (time.monotonic() + self.ttl_sec, value)
+            self._items.move_to_end(key)
+            
+            while len(self._items) > self.max_items:
+                self._items.popitem(last=False)
+    
+    def pop(self, key: Hashable):
+        """
+        Удаление записи из кэша
+        
+        Args:
+            key: Ключ записи
+        """
+        with self._lock:
+            self._items.pop(key, None)
+    
+    def clear(self):
+        """
+        Очистка кэша
+        """
+        with self._lock:
+            self._items.clear()
+    
+    def __len__(self) -> int:
+        return len(self._items)
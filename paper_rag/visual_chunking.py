@@ -2,47 +2,271 @@
 Модуль для чанкинга текста по визуальным заголовкам (размер шрифта, жирность)
 """
 
+import io
+import os
 import re
+import json
+import bisect
+import hashlib
+import functools
+import threading
 from typing import List, Dict, Optional, Tuple
 import logging
+from pathlib import Path
+from concurrent.futures import ProcessPoolExecutor
 
+import numpy as np
 import fitz
 import pdfplumber
 
 logger = logging.getLogger(__name__)
 
+# Математические символы, по которым отбрасываются формулы
+_MATH_RE = re.compile(r'[=≤≥±∞∑∏∫]')
+
+# Стандартные разделы статьи
+_STANDARD_SECTIONS = frozenset({
+    'Abstract', 'ABSTRACT',
+    'Introduction', 'INTRODUCTION', 
+    'Related Work', 'RELATED WORK',
+    'Background', 'BACKGROUND',
+    'Methods', 'METHODS', 'Methodology', 'METHODOLOGY',
+    'Results', 'RESULTS',
+    'Discussion', 'DISCUSSION',
+    'Conclusion', 'CONCLUSION', 'Conclusions', 'CONCLUSIONS',
+    'Acknowledgments', 'ACKNOWLEDGMENTS', 'Acknowledgements', 'ACKNOWLEDGEMENTS',
+    'References', 'REFERENCES',
+    'Bibliography', 'BIBLIOGRAPHY',
+    'Appendix', 'APPENDIX'
+})
+
+# Номер раздела, за которым идет текст ("1 Introduction", "2.1. Methods")
+_NUMBERED_TITLE_RE = re.compile(r'\d+(\.\d+)*[\.\s]*[A-Za-z]')
+
+# Одна буква + пробел (приложения: "E Additional Details")
+_LETTER_TITLE_RE = re.compile(r'[A-Z]\s+[A-Za-z]')
+
+# Приложение с буквой ("Appendix A")
+_APPENDIX_TITLE_RE = re.compile(r'Appendix\s+[A-Z]', re.IGNORECASE)
+
+# Нумерация перед заглавной буквой ("1. Introduction", "IV) Results")
+_NUMBERING_RE = re.compile(r'[\d\w]+[\.\)]\s*[A-Z]')
+
+# Все, что не входит в слова
+_NONWORD_RE = re.compile(r'\W+')
+
+# Признаки жирного начертания в имени шрифта
+_BOLD_FONT_RE = re.compile(r'bold|heavy|black', re.IGNORECASE)
+
+# Версия формата кэша заголовков: увеличивается при изменении логики детектора
+HEADERS_CACHE_VERSION = 1
+
+# Начиная с этого числа страниц, разбор PDF идет в пуле процессов
+# (PyMuPDF не поддерживает работу из нескольких потоков)
+PARALLEL_MIN_PAGES = 40
+
+# PDF меньше этого размера читается в память целиком перед разбором
+IN_MEMORY_MAX_BYTES = 50 * 1024 * 1024
+
+def _read_small_pdf(pdf_path: str) -> Optional[bytes]:
+    """
+    Чтение PDF в память, если файл небольшой
+    
+    Args:
+        pdf_path: Путь к PDF файлу
+        
+    Returns:
+        Содержимое файла или None, если файл больше IN_MEMORY_MAX_BYTES
+    """
+    pdf_path = os.fspath(pdf_path)
+    if os.path.getsize(pdf_path) >= IN_MEMORY_MAX_BYTES:
+        return None
+    
+    with open(pdf_path, 'rb') as f:
+        return f.read()
+
+# Заголовок сравнивается со всеми соседями при удалении дубликатов,
+# поэтому нормализованная форма текста вычисляется один раз
+@functools.lru_cache(maxsize=4096)
+def _cached_norm(text: str) -> Tuple[str, frozenset]:
+    """
+    Нормализация текста для проверки схожести
+    
+    Args:
+        text: Исходный текст
+        
+    Returns:
+        Кортеж (текст без небуквенных символов в нижнем регистре, множество слов)
+    """
+    text_lower = text.lower()
+    return _NONWORD_RE.sub('', text_lower), frozenset(text_lower.split())
+
+def _scan_pages(doc, start: int, stop: int) -> Tuple:
+    """
+    Разбор строк страниц [start, stop) документа PyMuPDF
+    
+    Args:
+        doc: Открытый документ PyMuPDF
+        start: Первая страница
+        stop: Страница, следующая за последней
+        
+    Returns:
+        Кортеж (тексты строк, размеры, жирность, Y координаты, номера страниц,
+        сумма размеров шрифтов, число спанов с размером, максимальный размер)
+    """
+    # Один проход по страницам: строки буферизуются в параллельные списки,
+    # а статистика шрифтов (средний и максимальный размер) считается на лету
+    line_texts = []
+    line_sizes = []
+    line_bolds = []
+    line_ys = []
+    line_pages = []
+    font_size_sum = 0.0
+    font_size_count = 0
+    max_font_size = 0
+    
+    # Картинки для анализа заголовков не нужны
+    text_flags = fitz.TEXTFLAGS_DICT & ~fitz.TEXT_PRESERVE_IMAGES
+    
+    for page_num in range(start, stop):
+        page = doc[page_num]
+        blocks = page.get_text("dict", flags=text_flags)
+        
+        for block in blocks.get("blocks", []):
+            if "lines" in block:
+                for line in block["lines"]:
+                    line_parts = []
+                    line_font_size = 0
+                    line_is_bold = False
+                    line_y = line.get("bbox", [0, 0, 0, 0])[1]  # Y координата
+                    
+                    for span in line.get("spans", []):
+                        text = span.get("text", "").strip()
+                        font_size = span.get("size", 0)
+                        
+                        if font_size > 0:
+                            font_size_sum += font_size
+                            font_size_count += 1
+                            if font_size > max_font_size:
+                                max_font_size = font_size
+                        
+                        if text:
+                            line_parts.append(text)
+                            if font_size > line_font_size:
+                                line_font_size = font_size
+                            # Проверяем жирность (флаг 16 = bold), пока строка не помечена жирной
+                            if not line_is_bold and span.get("flags", 0) & 16:
+                                line_is_bold = True
+                    
+                    line_texts.append(' '.join(line_parts))
+                    line_sizes.append(line_font_size)
+                    line_bolds.append(line_is_bold)
+                    line_ys.append(line_y)
+                    line_pages.append(page_num)
+    
+    return (line_texts, line_sizes, line_bolds, line_ys, line_pages,
+            font_size_sum, font_size_count, max_font_size)
+
+def _scan_pages_from_path(pdf_path: str, start: int, stop: int) -> Tuple:
+    """
+    Разбор диапазона страниц в процессе-воркере (документ открывается заново)
+    
+    Args:
+        pdf_path: Путь к PDF файлу
+        start: Первая страница
+        stop: Страница, следующая за последней
+        
+    Returns:
+        Результат _scan_pages
+    """
+    with fitz.open(pdf_path) as doc:
+        return _scan_pages(doc, start, stop)
+
+def _scan_pages_parallel(pdf_path: str, page_count: int) -> Tuple:
+    """
+    Разбор всех страниц непрерывными диапазонами в пуле процессов
+    
+    Args:
+        pdf_path: Путь к PDF файлу
+        page_count: Количество страниц
+        
+    Returns:
+        Результат _scan_pages для всего документа
+    """
+    workers = min(8, os.cpu_count() or 1)
+    step = -(-page_count // workers)
+    ranges = [(start, min(start + step, page_count)) for start in range(0, page_count, step)]
+    
+    with ProcessPoolExecutor(max_workers=workers) as executor:
+        parts = list(executor.map(
+            _scan_pages_from_path,
+            [pdf_path] * len(ranges),
+            [start for start, _ in ranges],
+            [stop for _, stop in ranges]
+        ))
+    
+    # Склеиваем результаты в порядке страниц
+    merged = ([], [], [], [], [])
+    font_size_sum = 0.0
+    font_size_count = 0
+    max_font_size = 0
+    for part in parts:
+        for column, values in zip(merged, part[:5]):
+            column.extend(values)
+        font_size_sum += part[5]
+        font_size_count += part[6]
+        max_font_size = max(max_font_size, part[7])
+    
+    return (*merged, font_size_sum, font_size_count, max_font_size)
+
 class VisualHeaderDetector:
     """
     Класс для определения заголовков по визуальному форматированию
     """
     
-    def __init__(self):
+    def __init__(self, cache_dir: str = "paper_rag/data/visual_headers"):
         """
         Инициализация детектора визуальных заголовков
+        
+        Args:
+            cache_dir: Директория для кэша найденных заголовков
         """
         self.min_font_size_ratio = 1.1  # Заголовок должен быть минимум на 10% больше обычного текста
         self.min_header_length = 3
         self.max_header_length = 100
         
-    def extract_visual_headers(self, pdf_path: str) -> List[Dict]:
+        # Кэш результатов: на диске между запусками и в памяти внутри процесса
+        self.cache_dir = Path(cache_dir)
+        self._memory_cache = {}
+        self._cache_lock = threading.Lock()
+        
+    def extract_visual_headers(self, pdf_path: str, max_pages: Optional[int] = None) -> List[Dict]:
         """
         Извлечение заголовков на основе визуального форматирования
         
         Args:
             pdf_path: Путь к PDF файлу
+            max_pages: Максимальное количество анализируемых страниц
+                (None - весь документ; например, 40 для предпросмотра)
             
         Returns:
             Список заголовков с информацией о форматировании
         """
+        cache_key = self._cache_key(pdf_path, max_pages)
+        cached = self._load_cached_headers(cache_key)
+        if cached is not None:
+            logger.info(f"Визуальные заголовки взяты из кэша: {pdf_path}")
+            return cached
+        
         logger.info(f"Анализ визуального форматирования PDF: {pdf_path}")
         
         # Пробуем разные методы
         headers = []
         
         if fitz:
-            headers = self._extract_headers_with_pymupdf(pdf_path)
+            headers = self._extract_headers_with_pymupdf(pdf_path, max_pages)
         elif pdfplumber:
-            headers = self._extract_headers_with_pdfplumber(pdf_path)
+            headers = self._extract_headers_with_pdfplumber(pdf_path, max_pages)
         else:
             logger.warning("Библиотеки для визуального анализа PDF недоступны")
             return []
@@ -51,114 +275,245 @@ class VisualHeaderDetector:
         valid_headers = self._filter_and_validate_headers(headers)
         
         logger.info(f"Найдено {len(valid_headers)} визуальных заголовков")
+        
+        # Пустой результат не кэшируем: он может быть следствием ошибки чтения
+        if valid_headers:
+            self._save_cached_headers(cache_key, valid_headers)
+        
         return valid_headers
     
-    def _extract_headers_with_pymupdf(self, pdf_path: str) -> List[Dict]:
+    def _cache_key(self, pdf_path: str, max_pages: Optional[int] = None) -> Optional[str]:
+        """
+        Ключ кэша по содержимому PDF: размер, время изменения и SHA-1 первых 64 КБ
+        
+        Args:
+            pdf_path: Путь к PDF файлу
+            max_pages: Ограничение количества страниц (входит в ключ)
+            
+        Returns:
+            Ключ кэша или None, если файл недоступен
+        """
+        try:
+            stat = os.stat(pdf_path)
+            with open(pdf_path, 'rb') as f:
+                head_hash = hashlib.sha1(f.read(65536)).hexdigest()
+        except OSError:
+            return None
+        
+        key = f"v{HEADERS_CACHE_VERSION}_{stat.st_size}_{stat.st_mtime_ns}_{head_hash}"
+        if max_pages is not None:
+            key += f"_p{max_pages}"
+        
+        return key
+    
+    def _load_cached_headers(self, cache_key: Optional[str]) -> Optional[List[Dict]]:
+        """
+        Загрузка заголовков из кэша в памяти или на диске
+        
+        Args:
+            cache_key: Ключ кэша
+            
+        Returns:
+            Копия сохраненных заголовков или None, если их нет
+        """
+        if cache_key is None:
+            return None
+        
+        with self._cache_lock:
+            headers = self._memory_cache.get(cache_key)
+        
+        if headers is None:
+            cache_path = self.cache_dir / f"{cache_key}.json"
+            if not cache_path.exists():
+                return None
+            
+            try:
+                with open(cache_path, 'r', encoding='utf-8') as f:
+                    headers = json.load(f)
+            except Exception as e:
+                logger.error(f"Ошибка чтения кэша заголовков {cache_path}: {e}")
+                return None
+            
+            with self._cache_lock:
+                self._memory_cache[cache_key] = headers
+        
+        return [dict(header) for header in headers]
+    
+    def _save_cached_headers(self, cache_key: Optional[str], headers: List[Dict]):
+        """
+        Сохранение заголовков в кэш в памяти и на диске
+        
+        Args:
+            cache_key: Ключ кэша
+            headers: Найденные заголовки
+        """
+        if cache_key is None:
+            return
+        
+        with self._cache_lock:
+            self._memory_cache[cache_key] = [dict(header) for header in headers]
+        
+        try:
+            self.cache_dir.mkdir(parents=True, exist_ok=True)
+            cache_path = self.cache_dir / f"{cache_key}.json"
+            # Пишем во временный файл и переименовываем, чтобы не оставить битый JSON
+            tmp_path = cache_path.with_suffix('.tmp')
+            with open(tmp_path, 'w', encoding='utf-8') as f:
+                json.dump(headers, f, ensure_ascii=False)
+            os.replace(tmp_path, cache_path)
+        except Exception as e:
+            logger.error(f"Ошибка сохранения кэша заголовков: {e}")
+    
+    def _extract_headers_with_pymupdf(self, pdf_path: str, max_pages: Optional[int] = None) -> List[Dict]:
         """
         Извлечение заголовков с помощью PyMuPDF
         
         Args:
             pdf_path: Путь к PDF файлу
+            max_pages: Максимальное количество анализируемых страниц (None - все)
             
         Returns:
             Список потенциальных заголовков
         """
         try:
-            doc = fitz.open(pdf_path)
+            # Небольшой файл разбирается из памяти: постраничный разбор
+            # обращается к файлу вразнобой
+            pdf_bytes = _read_small_pdf(pdf_path)
+            if pdf_bytes is not None:
+                doc = fitz.open(stream=pdf_bytes, filetype='pdf')
+            else:
+                doc = fitz.open(pdf_path)
+            page_count = len(doc) if max_pages is None else min(len(doc), max_pages)
+            
+            # Если в PDF есть оглавление, заголовки берутся из него без анализа шрифтов
+            headers = self._headers_from_toc(doc, page_count)
+            if headers:
+                doc.close()
+                logger.info(f"Заголовки взяты из оглавления PDF: {len(headers)}")
+                return headers
+            
             headers = []
             
-            # Сначала определяем средний размер шрифта в документе
-            font_sizes = []
+            # Страницы разбираются одним проходом; большие документы - в пуле процессов
+            if page_count >= PARALLEL_MIN_PAGES:
+                doc.close()
+                page_scan = _scan_pages_parallel(pdf_path, page_count)
+            else:
+                page_scan = _scan_pages(doc, 0, page_count)
+                doc.close()
             
-            for page_num in range(len(doc)):
-                page = doc[page_num]
-                blocks = page.get_text("dict")
-                
-                for block in blocks.get("blocks", []):
-                    if "lines" in block:
-                        for line in block["lines"]:
-                            for span in line.get("spans", []):
-                                font_size = span.get("size", 0)
-                                if font_size > 0:
-                                    font_sizes.append(font_size)
-            
-            if not font_sizes:
+            (line_texts, line_sizes, line_bolds, line_ys, line_pages,
+             font_size_sum, font_size_count, max_font_size) = page_scan
+            
+            if not font_size_count:
                 logger.warning("Не найдена информация о размерах шрифтов")
-                doc.close()
                 return []
             
             # Определяем средний и максимальный размер шрифта
-            avg_font_size = sum(font_sizes) / len(font_sizes)
-            max_font_size = max(font_sizes)
+            avg_font_size = font_size_sum / font_size_count
             header_threshold = avg_font_size * self.min_font_size_ratio
             
             logger.info(f"Средний размер шрифта: {avg_font_size:.1f}, порог для заголовков: {header_threshold:.1f}")
             
-            # Извлекаем заголовки
-            char_position = 0
+            # Отбираем строки-кандидаты векторно: словари строятся только для них.
+            # Приоритет жирности над размером шрифта
+            lengths = np.fromiter(map(len, line_texts), dtype=np.int64, count=len(line_texts))
+            sizes = np.asarray(line_sizes, dtype=np.float64)
+            bolds = np.asarray(line_bolds, dtype=bool)
             
-            for page_num in range(len(doc)):
-                page = doc[page_num]
-                blocks = page.get_text("dict")
+            # Позиция строки = суммарная длина предыдущих строк (+1 на перенос)
+            char_positions = np.cumsum(lengths + 1) - (lengths + 1)
+            
+            header_mask = (
+                (lengths > 0) &
+                (lengths >= self.min_header_length) &
+                (lengths <= self.max_header_length) &
+                (bolds | (sizes >= header_threshold))
+            )
+            
+            for idx in np.flatnonzero(header_mask).tolist():
+                line_text = line_texts[idx]
                 
-                for block in blocks.get("blocks", []):
-                    if "lines" in block:
-                        for line in block["lines"]:
-                            line_text = ""
-                            line_font_size = 0
-                            line_is_bold = False
-                            line_y = line.get("bbox", [0, 0, 0, 0])[1]  # Y координата
-                            
-                            for span in line.get("spans", []):
-                                text = span.get("text", "").strip()
-                                font_size = span.get("size", 0)
-                                font_flags = span.get("flags", 0)
-                                
-                                # Проверяем жирность (флаг 16 = bold)
-                                is_bold = bool(font_flags & 16)
-                                
-                                if text:
-                                    line_text += text + " "
-                                    line_font_size = max(line_font_size, font_size)
-                                    line_is_bold = line_is_bold or is_bold
-                            
-                            line_text = line_text.strip()
-                            
-                            # Проверяем, подходит ли строка для заголовка
-                            # Приоритет жирности над размером шрифта
-                            if (line_text and 
-                                len(line_text) >= self.min_header_length and
-                                len(line_text) <= self.max_header_length and
-                                (line_is_bold or line_font_size >= header_threshold)):
-                                
-                                headers.append({
-                                    'text': line_text,
-                                    'font_size': line_font_size,
-                                    'is_bold': line_is_bold,
-                                    'page': page_num + 1,
-                                    'y_position': line_y,
-                                    'char_position': char_position,
-                                    'score': self._calculate_header_score(
-                                        line_text, line_font_size, line_is_bold, 
-                                        avg_font_size, max_font_size
-                                    )
-                                })
-                            
-                            char_position += len(line_text) + 1
+                # Большинство кандидатов - обычный текст; отсекаем его до расчета score
+                if not self._is_valid_header_text(line_text):
+                    continue
+                
+                line_font_size = line_sizes[idx]
+                line_is_bold = line_bolds[idx]
+                
+                headers.append({
+                    'text': line_text,
+                    'font_size': line_font_size,
+                    'is_bold': line_is_bold,
+                    'page': line_pages[idx] + 1,
+                    'y_position': line_ys[idx],
+                    'char_position': int(char_positions[idx]),
+                    'score': self._calculate_header_score(
+                        line_text, line_font_size, line_is_bold, 
+                        avg_font_size, max_font_size
+                    )
+                })
             
-            doc.close()
             return headers
             
         except Exception as e:
             logger.error(f"Ошибка анализа PDF с PyMuPDF: {e}")
             return []
     
-    def _extract_headers_with_pdfplumber(self, pdf_path: str) -> List[Dict]:
+    def _headers_from_toc(self, doc, page_count: int) -> List[Dict]:
+        """
+        Построение заголовков по оглавлению (закладкам) PDF
+        
+        Args:
+            doc: Открытый документ PyMuPDF
+            page_count: Количество анализируемых страниц; записи на
+                последующих страницах отбрасываются
+            
+        Returns:
+            Список потенциальных заголовков или пустой список, если оглавления нет
+            или в нем меньше 3 записей
+        """
+        toc = doc.get_toc(simple=False)
+        if len(toc) < 3:
+            return []
+        
+        # Позиция начала каждой страницы в тексте: префиксная сумма длин
+        # простого текста страниц (get_text("text") намного дешевле "dict")
+        page_offsets = []
+        char_position = 0
+        for page_num in range(page_count):
+            page_offsets.append(char_position)
+            char_position += len(doc[page_num].get_text("text"))
+        
+        headers = []
+        for level, title, page_num, dest in toc:
+            title = title.strip()
+            if not title or page_num < 1 or page_num > len(page_offsets):
+                continue
+            
+            target = dest.get('to') if isinstance(dest, dict) else None
+            
+            headers.append({
+                'text': title,
+                'font_size': 0,
+                'is_bold': True,
+                'page': page_num,
+                'y_position': target.y if target is not None else 0,
+                'char_position': page_offsets[page_num - 1],
+                # Записи верхнего уровня оглавления получают score выше 3,
+                # чтобы считаться основными разделами
+                'score': 3.5 if level == 1 else 3.0
+            })
+        
+        return headers
+    
+    def _extract_headers_with_pdfplumber(self, pdf_path: str, max_pages: Optional[int] = None) -> List[Dict]:
         """
         Извлечение заголовков с помощью pdfplumber
         
         Args:
             pdf_path: Путь к PDF файлу
+            max_pages: Максимальное количество анализируемых страниц (None - все)
             
         Returns:
             Список потенциальных заголовков
@@ -167,58 +522,78 @@ class VisualHeaderDetector:
             headers = []
             char_position = 0
             
-            with pdfplumber.open(pdf_path) as pdf:
-                # Собираем информацию о размерах шрифтов
-                font_sizes = []
+            pdf_bytes = _read_small_pdf(pdf_path)
+            pdf_source = io.BytesIO(pdf_bytes) if pdf_bytes is not None else pdf_path
+            
+            with pdfplumber.open(pdf_source) as pdf:
+                pages = pdf.pages[:max_pages]
+                
+                # Один проход по страницам: статистика размеров шрифтов считается
+                # на лету, а строки-кандидаты буферизуются до вычисления порога
+                font_size_sum = 0.0
+                font_size_count = 0
+                max_font_size = 0
+                candidates = []
                 
-                for page in pdf.pages:
+                for page_num, page in enumerate(pages):
                     chars = page.chars
                     for char in chars:
                         size = char.get('size', 0)
                         if size > 0:
-                            font_sizes.append(size)
-                
-                if not font_sizes:
-                    logger.warning("Не найдена информация о размерах шрифтов")
-                    return []
-                
-                avg_font_size = sum(font_sizes) / len(font_sizes)
-                header_threshold = avg_font_size * self.min_font_size_ratio
-                
-                logger.info(f"Средний размер шрифта: {avg_font_size:.1f}, порог для заголовков: {header_threshold:.1f}")
-                
-                # Извлекаем потенциальные заголовки
-                for page_num, page in enumerate(pdf.pages):
+                            font_size_sum += size
+                            font_size_count += 1
+                            if size > max_font_size:
+                                max_font_size = size
+                    
                     # Группируем символы по строкам
-                    lines = self._group_chars_to_lines(page.chars)
+                    lines = self._group_chars_to_lines(chars)
                     
                     for line in lines:
                         line_text = line['text'].strip()
-                        line_font_size = line['max_font_size']
-                        
-                        # Простая эвристика для определения жирности
-                        # (если большинство символов имеют одинаковый шрифт)
-                        line_is_bold = self._estimate_boldness(line['chars'])
                         
                         if (line_text and 
                             len(line_text) >= self.min_header_length and
                             len(line_text) <= self.max_header_length and
-                            (line_font_size >= header_threshold or line_is_bold)):
+                            self._is_valid_header_text(line_text)):
+                            
+                            # Простая эвристика для определения жирности
+                            # (если большинство символов имеют одинаковый шрифт)
+                            line_is_bold = self._estimate_boldness(line['chars'])
                             
-                            headers.append({
-                                'text': line_text,
-                                'font_size': line_font_size,
-                                'is_bold': line_is_bold,
-                                'page': page_num + 1,
-                                'y_position': line['y_position'],
-                                'char_position': char_position,
-                                'score': self._calculate_header_score(
-                                    line_text, line_font_size, line_is_bold,
-                                    avg_font_size, max(font_sizes)
-                                )
-                            })
+                            candidates.append((
+                                line_text, line['max_font_size'], line_is_bold,
+                                page_num + 1, line['y_position'], char_position
+                            ))
                         
                         char_position += len(line_text) + 1
+                    
+                    # Разобранные объекты страницы больше не нужны
+                    page.flush_cache()
+                
+                if not font_size_count:
+                    logger.warning("Не найдена информация о размерах шрифтов")
+                    return []
+                
+                avg_font_size = font_size_sum / font_size_count
+                header_threshold = avg_font_size * self.min_font_size_ratio
+                
+                logger.info(f"Средний размер шрифта: {avg_font_size:.1f}, порог для заголовков: {header_threshold:.1f}")
+                
+                # Извлекаем потенциальные заголовки
+                for line_text, line_font_size, line_is_bold, page, y_position, position in candidates:
+                    if line_font_size >= header_threshold or line_is_bold:
+                        headers.append({
+                            'text': line_text,
+                            'font_size': line_font_size,
+                            'is_bold': line_is_bold,
+                            'page': page,
+                            'y_position': y_position,
+                            'char_position': position,
+                            'score': self._calculate_header_score(
+                                line_text, line_font_size, line_is_bold,
+                                avg_font_size, max_font_size
+                            )
+                        })
             
             return headers
             
@@ -239,35 +614,44 @@ class VisualHeaderDetector:
         if not chars:
             return []
         
-        lines = []
-        current_line = None
         tolerance = 2  # Допуск для Y координаты
         
-        for char in sorted(chars, key=lambda x: (x.get('y0', 0), x.get('x0', 0))):
-            y_pos = char.get('y0', 0)
-            
-            if current_line is None or abs(y_pos - current_line['y_position']) > tolerance:
-                # Начинаем новую строку
-                if current_line:
-                    lines.append(current_line)
-                
-                current_line = {
-                    'text': char.get('text', ''),
-                    'y_position': y_pos,
-                    'max_font_size': char.get('size', 0),
-                    'chars': [char]
-                }
-            else:
-                # Добавляем к текущей строке
-                current_line['text'] += char.get('text', '')
-                current_line['max_font_size'] = max(
-                    current_line['max_font_size'], 
-                    char.get('size', 0)
-                )
-                current_line['chars'].append(char)
+        # Сортировка по (y0, x0) в NumPy (lexsort стабилен, как и sorted)
+        ys = np.fromiter((char.get('y0', 0) for char in chars), dtype=np.float64, count=len(chars))
+        xs = np.fromiter((char.get('x0', 0) for char in chars), dtype=np.float64, count=len(chars))
+        sizes = np.fromiter((char.get('size', 0) for char in chars), dtype=np.float64, count=len(chars))
+        
+        order = np.lexsort((xs, ys))
+        ys_sorted = ys[order]
+        sorted_chars = [chars[idx] for idx in order]
+        
+        # Границы строк: строка продолжается, пока символ отстоит от ее
+        # первого символа не больше чем на tolerance. Поиск идет по строкам, а не по символам
+        line_starts = []
+        start = 0
+        while start < len(chars):
+            line_starts.append(start)
+            anchor = ys_sorted[start]
+            end = int(np.searchsorted(ys_sorted, anchor + tolerance, side='right'))
+            # Уточняем границу с учетом округления при сложении
+            while end < len(chars) and not (ys_sorted[end] - anchor > tolerance):
+                end += 1
+            while end - 1 > start and ys_sorted[end - 1] - anchor > tolerance:
+                end -= 1
+            start = end
+        
+        max_sizes = np.maximum.reduceat(sizes[order], line_starts).tolist()
+        line_ends = line_starts[1:] + [len(chars)]
         
-        if current_line:
-            lines.append(current_line)
+        lines = []
+        for line_start, line_end, max_font_size in zip(line_starts, line_ends, max_sizes):
+            line_chars = sorted_chars[line_start:line_end]
+            lines.append({
+                'text': ''.join(char.get('text', '') for char in line_chars),
+                'y_position': line_chars[0].get('y0', 0),
+                'max_font_size': max_font_size,
+                'chars': line_chars
+            })
         
         return lines
     
@@ -281,11 +665,16 @@ class VisualHeaderDetector:
         Returns:
             True если текст вероятно жирный
         """
-        bold_indicators = ['bold', 'Bold', 'BOLD', 'Heavy', 'Black']
+        # В строке обычно один-два шрифта: каждое имя проверяем один раз
+        seen_fonts = set()
         
         for char in chars:
-            font_name = char.get('fontname', '').lower()
-            if any(indicator.lower() in font_name for indicator in bold_indicators):
+            font_name = char.get('fontname', '')
+            if font_name in seen_fonts:
+                continue
+            seen_fonts.add(font_name)
+            
+            if _BOLD_FONT_RE.search(font_name):
                 return True
         
         return False
@@ -329,7 +718,7 @@ class VisualHeaderDetector:
             score += 0.3
         
         # Бонус за нумерацию (1., 2., I., etc.)
-        if re.match(r'^[\d\w]+[\.\)]\s*[A-Z]', text):
+        if _NUMBERING_RE.match(text):
             score += 0.5
         
         return score
@@ -350,8 +739,12 @@ class VisualHeaderDetector:
         # Сортируем по score (убывание)
         headers.sort(key=lambda x: x['score'], reverse=True)
         
-        # Удаляем дубликаты и близкие заголовки
+        # Удаляем дубликаты и близкие заголовки.
+        # Принятые заголовки дополнительно хранятся отсортированными по позиции,
+        # чтобы сравнивать кандидата только с соседями в окне ±100 символов
         filtered_headers = []
+        kept_positions = []
+        kept_by_position = []
         
         for header in headers:
             text = header['text'].strip()
@@ -362,15 +755,19 @@ class VisualHeaderDetector:
                 continue
             
             # Проверяем на дубликаты
-            is_duplicate = False
-            for existing in filtered_headers:
-                if (abs(header['char_position'] - existing['char_position']) < 100 and
-                    self._texts_similar(text, existing['text'])):
-                    is_duplicate = True
-                    break
+            char_position = header['char_position']
+            lo = bisect.bisect_right(kept_positions, char_position - 100)
+            hi = bisect.bisect_left(kept_positions, char_position + 100)
+            is_duplicate = any(
+                self._texts_similar(text, existing['text'])
+                for existing in kept_by_position[lo:hi]
+            )
             
             if not is_duplicate:
                 filtered_headers.append(header)
+                insert_idx = bisect.bisect_right(kept_positions, char_position)
+                kept_positions.insert(insert_idx, char_position)
+                kept_by_position.insert(insert_idx, header)
                 logger.debug(f"Добавлен заголовок: '{text}' (score: {header['score']:.2f})")
         
         # Сортируем по позиции в документе
@@ -407,8 +804,7 @@ class VisualHeaderDetector:
             return False
         
         # Исключаем чисто математические выражения
-        math_symbols = ['=', '≤', '≥', '±', '∞', '∑', '∏', '∫']
-        if any(symbol in text for symbol in math_symbols):
+        if _MATH_RE.search(text):
             return False
         
         # ДОПОЛНИТЕЛЬНЫЕ СТРОГИЕ КРИТЕРИИ:
@@ -427,38 +823,20 @@ class VisualHeaderDetector:
         
         # СТРОГИЕ КРИТЕРИИ:
         
-        # 1. Начинается с цифры (нумерованные разделы)
-        if re.match(r'^\d+', text):
-            # Должен иметь текст после числа (с точкой или без)
-            if re.match(r'^\d+(\.\d+)*[\.\s]*[A-Za-z]', text):
-                return True
+        # 1. Начинается с цифры (нумерованные разделы) и имеет текст после числа
+        if _NUMBERED_TITLE_RE.match(text):
+            return True
         
         # 2. Начинается с одной буквы + пробел (приложения)
-        if re.match(r'^[A-Z]\s+[A-Za-z]', text):
+        if _LETTER_TITLE_RE.match(text):
             return True
         
-        # 3. Стандартные разделы статьи
-        standard_sections = [
-            'Abstract', 'ABSTRACT',
-            'Introduction', 'INTRODUCTION', 
-            'Related Work', 'RELATED WORK',
-            'Background', 'BACKGROUND',
-            'Methods', 'METHODS', 'Methodology', 'METHODOLOGY',
-            'Results', 'RESULTS',
-            'Discussion', 'DISCUSSION',
-            'Conclusion', 'CONCLUSION', 'Conclusions', 'CONCLUSIONS',
-            'Acknowledgments', 'ACKNOWLEDGMENTS', 'Acknowledgements', 'ACKNOWLEDGEMENTS',
-            'References', 'REFERENCES',
-            'Bibliography', 'BIBLIOGRAPHY',
-            'Appendix', 'APPENDIX'
-        ]
-        
-        # Точное совпадение со стандартными разделами
-        if text in standard_sections:
+        # 3. Точное совпадение со стандартными разделами статьи
+        if text in _STANDARD_SECTIONS:
             return True
         
         # Appendix с буквой (Appendix A, Appendix B)
-        if re.match(r'^Appendix\s+[A-Z]', text, re.IGNORECASE):
+        if _APPENDIX_TITLE_RE.match(text):
             return True
         
         # Все остальное отклоняем
@@ -475,17 +853,14 @@ class VisualHeaderDetector:
             True если тексты схожи
         """
         # Простая проверка на схожесть
-        text1_clean = re.sub(r'\W+', '', text1.lower())
-        text2_clean = re.sub(r'\W+', '', text2.lower())
+        text1_clean, words1 = _cached_norm(text1)
+        text2_clean, words2 = _cached_norm(text2)
         
         if text1_clean == text2_clean:
             return True
         
         # Проверяем пересечение слов
-        words1 = set(text1.lower().split())
-        words2 = set(text2.lower().split())
-        
-        if len(words1.intersection(words2)) / max(len(words1), len(words2)) > 0.7:
+        if len(words1 & words2) / max(len(words1), len(words2)) > 0.7:
             return True
         
         return False
@@ -2,10 +2,20 @@
 UI пакет для ArXiv Assistant
 """
 
+import importlib
+
+# Имя объекта совпадает с именем подмодуля, поэтому он импортируется сразу:
+# иначе после импорта ui.arxiv_api атрибут пакета указывал бы на модуль.
+# Модуль легкий (requests)
 from ui.arxiv_api import arxiv_api
-from ui.chat import chat_manager
-from ui.components import ui_components
-from ui.styles import apply_custom_styles
+
+# Остальные объекты импортируются лениво при первом обращении (PEP 562):
+# chat и components тянут за собой RAG-пайплайн и модели эмбеддингов
+_LAZY_EXPORTS = {
+    'chat_manager': 'ui.chat',
+    'ui_components': 'ui.components',
+    'apply_custom_styles': 'ui.styles'
+}
 
 __all__ = [
     'arxiv_api',
@@ -13,3 +23,22 @@ __all__ = [
     'ui_components',
     'apply_custom_styles'
 ]
+
+def __getattr__(name: str):
+    """
+    Ленивый импорт экспортируемых объектов пакета
+    
+    Args:
+        name: Имя атрибута
+        
+    Returns:
+        Объект из соответствующего модуля пакета
+    """
+    module_name = _LAZY_EXPORTS.get(name)
+    if module_name is None:
+        raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+    
+    value = getattr(importlib.import_module(module_name), name)
+    # Кэшируем в пространстве имен пакета: следующие обращения идут мимо __getattr__
+    globals()[name] = value
+    return value
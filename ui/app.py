@@ -83,6 +83,9 @@ class ArxivAssistantApp:
             with st.spinner("🔍 Поиск статей..."):
                 articles = arxiv_api.search_articles(search_query, max_results)
             
+            # Прогреваем кэш статусов RAG для первых статей выдачи
+            chat_manager.prefetch_rag_status([article['arxiv_id'] for article in articles[:4]])
+            
             # Отображение результатов
             ui_components.display_search_results(articles)
         
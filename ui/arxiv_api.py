@@ -2,20 +2,81 @@
 Модуль для работы с ArXiv API
 """
 
+import os
+import json
+import time
+import asyncio
+import hashlib
+import threading
+import logging
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+from urllib.parse import urlencode
 import requests
-import feedparser
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+import xml.etree.ElementTree as ET
 import re
 import html
-from typing import List, Dict
+from typing import List, Dict, Optional
 import streamlit as st
 
+logger = logging.getLogger(__name__)
+
+# Время жизни кэша результатов поиска: метаданные arXiv обновляются раз в сутки
+SEARCH_CACHE_TTL = 24 * 60 * 60
+
+# Пространство имен Atom в ответах arXiv API
+_ATOM_NS = {'atom': 'http://www.w3.org/2005/Atom'}
+
+# Последовательности пробельных символов в заголовках и аннотациях
+_WS_RE = re.compile(r'\s+')
+
 class ArxivAPI:
     """
     Класс для работы с ArXiv API
     """
     
-    def __init__(self):
+    # Неизменяемая часть параметров поискового запроса
+    _STATIC_PARAMS = {
+        'start': 0,
+        'sortBy': 'relevance',
+        'sortOrder': 'descending'
+    }
+    
+    def __init__(self, cache_dir: str = "paper_rag/data/arxiv_cache",
+                 source_dir: str = "paper_rag/data/sources"):
+        """
+        Инициализация клиента ArXiv API
+        
+        Args:
+            cache_dir: Директория для кэша результатов поиска
+            source_dir: Директория для скачанных исходников статей
+        """
         self.base_url = "http://export.arxiv.org/api/query?"
+        self.source_dir = Path(source_dir)
+        
+        # Кэш результатов поиска: на диске между запусками и в памяти внутри процесса
+        self.cache_dir = Path(cache_dir)
+        self._memory_cache = {}
+        self._cache_lock = threading.Lock()
+        
+        # Общая HTTP сессия: keep-alive соединения к arxiv.org без повторного
+        # TLS рукопожатия и повторы при 5xx
+        self.session = requests.Session()
+        adapter = HTTPAdapter(
+            pool_connections=16,
+            pool_maxsize=16,
+            max_retries=Retry(total=3, backoff_factor=0.3, status_forcelist=[502, 503, 504])
+        )
+        self.session.mount("https://", adapter)
+        self.session.mount("http://", adapter)
+        
+        # Atom ответы хорошо сжимаются; requests распаковывает gzip сам
+        self.session.headers.update({
+            'Accept-Encoding': 'gzip, deflate',
+            'User-Agent': 'ArxivAssistant/1.0'
+        })
     
     def search_articles(self, query: str, max_results: int = 10) -> List[Dict]:
         """
@@ -28,43 +89,157 @@ class ArxivAPI:
         Returns:
             Список словарей с информацией о статьях
         """
+        url = self._build_search_url(query, max_results)
+        
+        try:
+            return self._fetch_articles(url)
+        
+        except requests.RequestException as e:
+            st.error(f"Ошибка при запросе к arXiv API: {e}")
+            return []
+        except Exception as e:
+            st.error(f"Неожиданная ошибка: {e}")
+            return []
+    
+    async def search_articles_async(self, query: str, max_results: int = 10) -> List[Dict]:
+        """
+        Асинхронный поиск статей в arXiv API
+        
+        Запрос выполняется в пуле потоков event loop, поэтому несколько поисков
+        можно запускать одновременно через asyncio.gather. Ошибки не выводятся
+        в интерфейс, а пробрасываются вызывающему коду
+        
+        Args:
+            query: Поисковый запрос
+            max_results: Максимальное количество результатов
+            
+        Returns:
+            Список словарей с информацией о статьях
+        """
+        url = self._build_search_url(query, max_results)
+        return await asyncio.to_thread(self._fetch_articles, url)
+    
+    def _build_search_url(self, query: str, max_results: int) -> str:
+        """
+        Формирование URL поискового запроса
+        
+        Args:
+            query: Поисковый запрос
+            max_results: Максимальное количество результатов
+            
+        Returns:
+            URL запроса к arXiv API
+        """
         params = {
             'search_query': f'all:{query}',
-            'start': 0,
             'max_results': max_results,
-            'sortBy': 'relevance',
-            'sortOrder': 'descending'
+            **self._STATIC_PARAMS
         }
         
-        # Формируем URL запроса
-        url = self.base_url + "&".join([f"{k}={v}" for k, v in params.items()])
+        # Формируем URL запроса; urlencode экранирует пробелы, '&' и '+' в запросе
+        return self.base_url + urlencode(params)
+    
+    def _fetch_articles(self, url: str) -> List[Dict]:
+        """
+        Выполнение поискового запроса и разбор ответа
         
-        try:
-            response = requests.get(url, timeout=10)
-            response.raise_for_status()
-            
-            feed = feedparser.parse(response.content)
+        Args:
+            url: URL запроса к arXiv API
             
-            articles = []
-            for entry in feed.entries:
-                article = self._parse_entry(entry)
-                articles.append(article)
+        Returns:
+            Список словарей с информацией о статьях
+        """
+        # URL однозначно задает запрос и количество результатов
+        cache_key = hashlib.blake2b(url.encode('utf-8'), digest_size=16).hexdigest()
+        cached = self._load_cached_search(cache_key)
+        if cached is not None:
+            return cached
+        
+        response = self.session.get(url, timeout=10)
+        response.raise_for_status()
+        
+        # Ответ arXiv - корректный Atom, поэтому разбираем его C-парсером
+        # ElementTree без санитизации и эвристик feedparser
+        feed = ET.fromstring(response.content)
+        
+        articles = []
+        for entry in feed.iterfind('atom:entry', _ATOM_NS):
+            article = self._parse_entry(entry)
+            articles.append(article)
+        
+        # Пустой результат не кэшируем: он может быть следствием сбоя API
+        if articles:
+            self._save_cached_search(cache_key, articles)
+        
+        return articles
+    
+    def _load_cached_search(self, cache_key: str) -> Optional[List[Dict]]:
+        """
+        Загрузка результатов поиска из кэша в памяти или на диске
+        
+        Args:
+            cache_key: Ключ кэша
             
-            return articles
+        Returns:
+            Копия сохраненных статей или None, если их нет или кэш устарел
+        """
+        now = time.time()
         
-        except requests.RequestException as e:
-            st.error(f"Ошибка при запросе к arXiv API: {e}")
-            return []
+        with self._cache_lock:
+            item = self._memory_cache.get(cache_key)
+        
+        if item is not None and now - item[0] < SEARCH_CACHE_TTL:
+            return [dict(article) for article in item[1]]
+        
+        cache_path = self.cache_dir / f"{cache_key}.json"
+        try:
+            saved_at = cache_path.stat().st_mtime
+        except OSError:
+            return None
+        
+        if now - saved_at >= SEARCH_CACHE_TTL:
+            return None
+        
+        try:
+            with open(cache_path, 'r', encoding='utf-8') as f:
+                articles = json.load(f)
         except Exception as e:
-            st.error(f"Неожиданная ошибка: {e}")
-            return []
+            logger.error(f"Ошибка чтения кэша поиска {cache_path}: {e}")
+            return None
+        
+        with self._cache_lock:
+            self._memory_cache[cache_key] = (saved_at, articles)
+        
+        return [dict(article) for article in articles]
     
-    def _parse_entry(self, entry) -> Dict:
+    def _save_cached_search(self, cache_key: str, articles: List[Dict]):
+        """
+        Сохранение результатов поиска в кэш в памяти и на диске
+        
+        Args:
+            cache_key: Ключ кэша
+            articles: Найденные статьи
+        """
+        with self._cache_lock:
+            self._memory_cache[cache_key] = (time.time(), [dict(article) for article in articles])
+        
+        try:
+            self.cache_dir.mkdir(parents=True, exist_ok=True)
+            cache_path = self.cache_dir / f"{cache_key}.json"
+            # Пишем во временный файл и переименовываем, чтобы не оставить битый JSON
+            tmp_path = cache_path.with_suffix('.tmp')
+            with open(tmp_path, 'w', encoding='utf-8') as f:
+                json.dump(articles, f, ensure_ascii=False)
+            os.replace(tmp_path, cache_path)
+        except Exception as e:
+            logger.error(f"Ошибка сохранения кэша поиска: {e}")
+    
+    def _parse_entry(self, entry: ET.Element) -> Dict:
         """
         Парсинг отдельной записи из ответа API
         
         Args:
-            entry: Запись из feedparser
+            entry: Элемент <entry> Atom ленты
             
         Returns:
             Словарь с информацией о статье
@@ -75,35 +250,35 @@ class ArxivAPI:
         # Извлекаем и очищаем аннотацию
         abstract, full_abstract = self._extract_abstract(entry)
         
-        # Извлекаем ссылку на PDF
-        pdf_link = self._extract_pdf_link(entry)
+        # Извлекаем ссылки на страницу статьи и на PDF
+        link, pdf_link = self._extract_links(entry)
         
         # Очищаем заголовок от HTML тегов и лишних символов
         title = self._clean_title(entry)
         
+        entry_id = entry.findtext('atom:id', None, _ATOM_NS)
+        
         return {
             'title': title,
             'authors': authors,
             'abstract': abstract,
             'full_abstract': full_abstract,
-            'link': entry.link if hasattr(entry, 'link') else "",
+            'link': link,
             'pdf_link': pdf_link,
-            'published': entry.published if hasattr(entry, 'published') else "",
-            'arxiv_id': entry.id.split('/')[-1] if hasattr(entry, 'id') else ""
+            'published': entry.findtext('atom:published', '', _ATOM_NS),
+            'arxiv_id': entry_id.split('/')[-1] if entry_id is not None else ""
         }
     
-    def _extract_authors(self, entry) -> List[str]:
+    def _extract_authors(self, entry: ET.Element) -> List[str]:
         """
         Извлечение списка авторов из записи
         """
-        authors = []
-        if hasattr(entry, 'authors'):
-            authors = [author.name for author in entry.authors]
-        elif hasattr(entry, 'author'):
-            authors = [entry.author]
-        return authors
+        return [
+            author.findtext('atom:name', '', _ATOM_NS)
+            for author in entry.iterfind('atom:author', _ATOM_NS)
+        ]
     
-    def _extract_abstract(self, entry) -> tuple:
+    def _extract_abstract(self, entry: ET.Element) -> tuple:
         """
         Извлечение аннотации из записи
         
@@ -112,22 +287,28 @@ class ArxivAPI:
         """
         abstract = ""
         full_abstract = ""
-        if hasattr(entry, 'summary'):
-            full_abstract = re.sub(r'\s+', ' ', entry.summary.strip())
+        summary = entry.findtext('atom:summary', None, _ATOM_NS)
+        if summary is not None:
+            full_abstract = _WS_RE.sub(' ', summary.strip())
             abstract = full_abstract[:300] + "..." if len(full_abstract) > 300 else full_abstract
         return abstract, full_abstract
     
-    def _extract_pdf_link(self, entry) -> str:
+    def _extract_links(self, entry: ET.Element) -> tuple:
         """
-        Извлечение ссылки на PDF из записи
+        Извлечение ссылок из записи за один проход по элементам <link>
+        
+        Returns:
+            Кортеж (ссылка на страницу статьи, ссылка на PDF)
         """
+        link = ""
         pdf_link = ""
-        if hasattr(entry, 'links'):
-            for link in entry.links:
-                if link.type == 'application/pdf':
-                    pdf_link = link.href
-                    break
-        return pdf_link
+        for link_element in entry.iterfind('atom:link', _ATOM_NS):
+            href = link_element.get('href', '')
+            if not link and link_element.get('rel', 'alternate') == 'alternate':
+                link = href
+            if not pdf_link and link_element.get('type') == 'application/pdf':
+                pdf_link = href
+        return link, pdf_link
     
     def get_source_links(self, arxiv_id: str) -> Dict[str, str]:
         """
@@ -163,9 +344,6 @@ class ArxivAPI:
         Returns:
             Путь к скачанному файлу или None при ошибке
         """
-        import os
-        from pathlib import Path
-        
         try:
             source_links = self.get_source_links(arxiv_id)
             
@@ -176,7 +354,7 @@ class ArxivAPI:
             url = source_links[format_type]
             
             # Создаем папку для исходного кода
-            source_dir = Path("paper_rag/data/sources")
+            source_dir = self.source_dir
             source_dir.mkdir(parents=True, exist_ok=True)
             
             # Определяем имя файла
@@ -189,12 +367,27 @@ class ArxivAPI:
             
             file_path = source_dir / filename
             
-            # Скачиваем файл
-            response = requests.get(url, timeout=30)
-            response.raise_for_status()
-            
-            with open(file_path, 'wb') as f:
-                f.write(response.content)
+            # Скачиваем файл потоково блоками по 1 МБ, не держа архив в памяти.
+            # Пишем во временный файл, чтобы при обрыве не остался неполный архив
+            tmp_path = file_path.with_name(file_path.name + '.part')
+            with self.session.get(url, stream=True, timeout=30) as response:
+                response.raise_for_status()
+                
+                # При stream=True тело еще не скачано: если вместо архива пришла
+                # HTML страница (например, статья отозвана), прерываемся сразу
+                content_type = response.headers.get('Content-Type', '')
+                if format_type != 'abs' and content_type.startswith('text/html'):
+                    raise ValueError(f"arXiv вернул HTML страницу вместо файла ({url})")
+                
+                try:
+                    with open(tmp_path, 'wb') as f:
+                        for chunk in response.iter_content(chunk_size=1 << 20):
+                            f.write(chunk)
+                    os.replace(tmp_path, file_path)
+                except BaseException:
+                    # Не оставляем недокачанный архив на диске
+                    tmp_path.unlink(missing_ok=True)
+                    raise
             
             st.success(f"Исходный код скачан: {file_path}")
             return str(file_path)
@@ -213,39 +406,60 @@ class ArxivAPI:
         Returns:
             Список доступных форматов
         """
-        available_formats = []
+        return self.get_available_formats_batch([arxiv_id])[arxiv_id]
+    
+    def get_available_formats_batch(self, arxiv_ids: List[str]) -> Dict[str, List[str]]:
+        """
+        Проверка доступных форматов сразу для нескольких статей
         
-        try:
-            # Проверяем PDF
-            pdf_url = f"https://arxiv.org/pdf/{arxiv_id}.pdf"
-            response = requests.head(pdf_url, timeout=5)
-            if response.status_code == 200:
-                available_formats.append('pdf')
-            
-            # Проверяем исходный код
-            source_url = f"https://arxiv.org/e-print/{arxiv_id}"
-            response = requests.head(source_url, timeout=5)
-            if response.status_code == 200:
-                available_formats.append('source')
-            
-            # Проверяем LaTeX формат
-            latex_url = f"https://arxiv.org/format/{arxiv_id}/source"
-            response = requests.head(latex_url, timeout=5)
-            if response.status_code == 200:
-                available_formats.append('latex')
-                
-        except Exception as e:
-            st.warning(f"Ошибка при проверке форматов: {e}")
+        Args:
+            arxiv_ids: Идентификаторы arXiv статей
+            
+        Returns:
+            Словарь arxiv_id -> список доступных форматов
+        """
+        # Проверяемые форматы в порядке вывода
+        format_urls = {
+            arxiv_id: {
+                'pdf': f"https://arxiv.org/pdf/{arxiv_id}.pdf",
+                'source': f"https://arxiv.org/e-print/{arxiv_id}",
+                'latex': f"https://arxiv.org/format/{arxiv_id}/source"
+            }
+            for arxiv_id in arxiv_ids
+        }
+        
+        # HEAD запросы независимы, поэтому все они выполняются параллельно
+        # (не больше размера пула соединений сессии)
+        probes_count = sum(len(urls) for urls in format_urls.values())
+        with ThreadPoolExecutor(max_workers=max(1, min(16, probes_count))) as executor:
+            futures = {
+                arxiv_id: {
+                    format_type: executor.submit(self.session.head, url, timeout=5)
+                    for format_type, url in urls.items()
+                }
+                for arxiv_id, urls in format_urls.items()
+            }
+        
+        # Результаты собираются в основном потоке, где доступен st.warning
+        available_formats = {}
+        for arxiv_id, format_futures in futures.items():
+            available_formats[arxiv_id] = []
+            for format_type, future in format_futures.items():
+                try:
+                    if future.result().status_code == 200:
+                        available_formats[arxiv_id].append(format_type)
+                except Exception as e:
+                    st.warning(f"Ошибка при проверке форматов: {e}")
         
         return available_formats
     
-    def _clean_title(self, entry) -> str:
+    def _clean_title(self, entry: ET.Element) -> str:
         """
         Очистка заголовка от HTML тегов и лишних символов
         """
-        title = entry.title if hasattr(entry, 'title') else "Без названия"
+        title = entry.findtext('atom:title', "Без названия", _ATOM_NS)
         title = html.unescape(title)  # Декодируем HTML entities
-        title = re.sub(r'\s+', ' ', title.strip())  # Убираем лишние пробелы
+        title = _WS_RE.sub(' ', title.strip())  # Убираем лишние пробелы
         return title
 
 # Глобальный экземпляр API
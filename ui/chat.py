@@ -10,9 +10,13 @@ from paper_rag.async_processor import async_processor
 from llm_models import llm_factory, get_best_available_model
 from ui.dialogue_manager import article_dialogue_manager
 from paper_rag.embeddings import embedding_manager
+from paper_rag.utils import TTLCache
 
 logger = logging.getLogger(__name__)
 
+# Строка отладочного вывода для BM25 кандидата
+_CANDIDATE_DEBUG_FMT = "   {i}. BM25: {score:.3f} | Чанк #{chunk} | {section}\n      Текст: {text}..."
+
 class ChatManager:
     """
     Class for managing chat and dialogues
@@ -22,6 +26,13 @@ class ChatManager:
         self.chat_key = 'chat_history'
         self.llm_model = None
         self.current_model_info = None
+        
+        # Статус обработки статей: обработанная статья остается обработанной,
+        # поэтому запоминается навсегда; остальные статусы живут несколько секунд,
+        # чтобы прогресс обработки продолжал обновляться
+        self._processed_articles = set()
+        self._rag_status_cache = TTLCache(max_items=256, ttl_sec=5.0)
+        
         self._initialize_llm()
     
     def _initialize_llm(self):
@@ -121,6 +132,8 @@ class ChatManager:
         
         # Очищаем диалог статьи если указан
         if arxiv_id:
+            self._processed_articles.discard(arxiv_id)
+            self._rag_status_cache.pop(arxiv_id)
             article_dialogue_manager.clear_article_dialogue(arxiv_id)
             logger.info(f"Диалог статьи {arxiv_id} очищен")
     
@@ -205,6 +218,47 @@ class ChatManager:
         if not arxiv_id:
             return {'processed': False, 'processing': False}
         
+        if arxiv_id in self._processed_articles:
+            return {'processed': True, 'processing': False}
+        
+        cached = self._rag_status_cache.get(arxiv_id)
+        if cached is not None:
+            return cached
+        
+        rag_status = self._fetch_rag_status(arxiv_id)
+        if rag_status is None:
+            return {'processed': False, 'processing': False}
+        
+        if rag_status['processed']:
+            self._processed_articles.add(arxiv_id)
+        else:
+            self._rag_status_cache.set(arxiv_id, rag_status)
+        
+        return rag_status
+    
+    def prefetch_rag_status(self, arxiv_ids: List[str]):
+        """
+        Предварительное заполнение кэша статусов для статей из результатов поиска,
+        чтобы при переходе к статье статус уже был известен
+        
+        Args:
+            arxiv_ids: ID статей arXiv
+        """
+        # Проверка статуса - это обращения к словарям в памяти,
+        # поэтому отдельные потоки для нее не нужны
+        for arxiv_id in arxiv_ids:
+            self._check_rag_status(arxiv_id)
+    
+    def _fetch_rag_status(self, arxiv_id: str) -> Optional[Dict]:
+        """
+        Запрос статуса обработки статьи у асинхронного процессора и индекса
+        
+        Args:
+            arxiv_id: ID статьи arXiv
+            
+        Returns:
+            Словарь со статусом или None при ошибке
+        """
         try:
             article_status = async_processor.get_article_status(arxiv_id)
             
@@ -215,19 +269,15 @@ class ChatManager:
                 elif status in ['queued', 'processing']:
                     return {'processed': False, 'processing': True, 'status': article_status}
             
-            chunks_for_article = [
-                chunk for chunk in embedding_manager.chunks_metadata 
-                if chunk.get('metadata', {}).get('arxiv_id') == arxiv_id
-            ]
-            
-            if len(chunks_for_article) > 0:
+            # Обратный индекс статья -> чанки вместо прохода по всем метаданным
+            if embedding_manager.arxiv_to_chunk_ids.get(arxiv_id):
                 return {'processed': True, 'processing': False}
             
             return {'processed': False, 'processing': False}
             
         except Exception as e:
             logger.error(f"Ошибка проверки RAG статуса: {e}")
-            return {'processed': False, 'processing': False}
+            return None
     
     def _generate_rag_response(self, user_input: str, article: Dict, arxiv_id: str) -> str:
         """
@@ -253,19 +303,19 @@ class ChatManager:
             section_chunks = rag_result.get('section_chunks', [chunk])
             
             if len(section_chunks) > 1:
-                section_texts = []
-                for sc in section_chunks:
-                    text = sc.get('text', '').strip()
-                    if text:
-                        section_texts.append(text)
-                context_text = " ".join(section_texts)
+                section_texts = [text for text in (sc.get('text', '').strip() for sc in section_chunks) if text]
                 
+                # Длина склейки известна заранее: длинная секция не склеивается целиком
                 max_context_length = 3000
-                if len(context_text) > max_context_length:
+                context_length = sum(map(len, section_texts)) + max(len(section_texts) - 1, 0)
+                
+                if context_length <= max_context_length:
+                    context_text = " ".join(section_texts)
+                else:
                     top_chunk_text = chunk.get('text', '')
                     remaining_length = max_context_length - len(top_chunk_text) - 50
                     if remaining_length > 0:
-                        context_text = context_text[:remaining_length] + "... [MOST RELEVANT PART]: " + top_chunk_text
+                        context_text = f"{self._join_prefix(section_texts, remaining_length)}... [MOST RELEVANT PART]: {top_chunk_text}"
                     else:
                         context_text = top_chunk_text
             else:
@@ -296,20 +346,14 @@ class ChatManager:
                     else:
                         header = "🤖 **Ответ на основе анализа статьи:**\n"
                     
-                    response_parts = [
-                        header,
-                        llm_response['content']
-                    ]
-                    
                     section = chunk_metadata.get('section', 'Unknown Section')
-                    source_info = f"\n📍 *Источник: {section}*"
-                    response_parts.append(source_info)
+                    response = f"{header}\n{llm_response['content']}\n\n📍 *Источник: {section}*"
                     
                     #top_chunk_info = self._format_top_chunk_debug(chunk)
                     #if top_chunk_info:
-                    #    response_parts.append(top_chunk_info)
+                    #    response += "\n" + top_chunk_info
                     
-                    return "\n".join(response_parts)
+                    return response
             
             if len(section_chunks) > 1:
                 section_name = chunk_metadata.get('section', 'Unknown Section')
@@ -317,24 +361,41 @@ class ChatManager:
             else:
                 header = "📄 **Найдена релевантная информация:**\n"
             
-            response_parts = [
-                header,
-                context_text[:500] + "..." if len(context_text) > 500 else context_text
-            ]
-            
+            preview = context_text[:500] + "..." if len(context_text) > 500 else context_text
             section = chunk_metadata.get('section', 'Unknown Section')
-            response_parts.append(f"\n📍 *Источник: {section}*")
+            response = f"{header}\n{preview}\n\n📍 *Источник: {section}*"
             
             #top_chunk_info = self._format_top_chunk_debug(chunk)
             #if top_chunk_info:
-            #    response_parts.append(top_chunk_info)
+            #    response += "\n" + top_chunk_info
             
-            return "\n".join(response_parts)
+            return response
                 
         except Exception as e:
             logger.error(f"Ошибка генерации RAG ответа: {e}")
             return self._generate_simple_response()
     
+    def _join_prefix(self, texts: List[str], length: int) -> str:
+        """
+        Первые length символов склейки текстов через пробел
+        без склеивания всех текстов
+        
+        Args:
+            texts: Тексты для склейки
+            length: Нужная длина префикса
+            
+        Returns:
+            Префикс склейки
+        """
+        parts = []
+        total = 0
+        for text in texts:
+            parts.append(text)
+            total += len(text) + 1
+            if total > length:
+                break
+        return " ".join(parts)[:length]
+    
     def _generate_processing_response(self, rag_status: Dict) -> str:
         """
         Генерация ответа во время обработки статьи
@@ -425,6 +486,10 @@ class ChatManager:
         Returns:
             Отформатированная отладочная информация
         """
+        # Без уровня DEBUG отладочные строки не собираются
+        if not logger.isEnabledFor(logging.DEBUG):
+            return ""
+        
         try:
             chunk_metadata = chunk.get('metadata', {})
             chunk_text = chunk.get('text', '')
@@ -455,14 +520,16 @@ class ChatManager:
             bm25_candidates = chunk.get('debug_bm25_candidates', [])
             if bm25_candidates:
                 debug_parts.append(f"\n📋 **BM25 кандидаты (топ-{len(bm25_candidates)}):**")
-                for i, candidate in enumerate(bm25_candidates, 1):
-                    cand_meta = candidate.get('metadata', {})
-                    cand_section = cand_meta.get('section', 'Unknown')
-                    cand_chunk = cand_meta.get('chunk_index', 'N/A')
-                    cand_score = candidate.get('score', 0)
-                    cand_text = candidate.get('text', '')[:100].replace('\n', ' ')
-                    debug_parts.append(f"   {i}. BM25: {cand_score:.3f} | Чанк #{cand_chunk} | {cand_section}")
-                    debug_parts.append(f"      Текст: {cand_text}...")
+                debug_parts.extend(
+                    _CANDIDATE_DEBUG_FMT.format(
+                        i=i,
+                        score=candidate.get('score', 0),
+                        chunk=candidate.get('metadata', {}).get('chunk_index', 'N/A'),
+                        section=candidate.get('metadata', {}).get('section', 'Unknown'),
+                        text=candidate.get('text', '')[:100].replace('\n', ' ')
+                    )
+                    for i, candidate in enumerate(bm25_candidates, 1)
+                )
             
             # Показываем полный текст выбранного чанка
             debug_parts.append(f"\n💬 **Полный текст выбранного чанка:**")
@@ -13,14 +13,24 @@ from paper_rag.async_processor import async_processor
 from paper_rag.embeddings import embedding_manager
 from ui.summary import summarize_paper_by_sections
 from ui.dialogue_manager import article_dialogue_manager
-from paper_rag.pdf_processor import PDFProcessor
-from paper_rag.chunking import TextChunker
 from paper_rag.embeddings import embedding_manager
 from llm_models import llm_factory
 from llm_models.config import llm_config
 
 logger = logging.getLogger(__name__)
 
+# Опрос Ollama идет по HTTP, а селектор модели отрисовывается на каждом
+# перезапуске скрипта, поэтому список моделей кэшируется на минуту
+@st.cache_data(ttl=60, show_spinner=False)
+def _discover_llm_models() -> Dict:
+    """
+    Получение списка доступных LLM моделей
+    
+    Returns:
+        Словарь с доступными моделями по типам
+    """
+    return llm_factory.get_available_models()
+
 class UIComponents:
     """
     Класс для UI компонентов приложения
@@ -174,22 +184,18 @@ class UIComponents:
         st.markdown("---")
         
         arxiv_id = article.get('arxiv_id')
-        rag_ready = False
+        chunks_count = 0
         
         if arxiv_id:
-            try:
-                chunks_for_article = [
-                    chunk for chunk in embedding_manager.chunks_metadata 
-                    if chunk.get('metadata', {}).get('arxiv_id') == arxiv_id
-                ]
-                rag_ready = len(chunks_for_article) > 0
-            except:
-                rag_ready = False
+            # Обратный индекс статья -> чанки вместо прохода по всем метаданным
+            chunks_count = len(embedding_manager.arxiv_to_chunk_ids.get(arxiv_id, ()))
+        
+        rag_ready = chunks_count > 0
         
         currently_summarizing = st.session_state.get('summarizing', False)
         
         if rag_ready:
-            st.success(f"✅ RAG готов для суммаризации {arxiv_id} ({len(chunks_for_article) if 'chunks_for_article' in locals() else 0} чанков)")
+            st.success(f"✅ RAG готов для суммаризации {arxiv_id} ({chunks_count} чанков)")
         else:
             st.info(f"📄 RAG не готов для {arxiv_id}")
         
@@ -374,48 +380,14 @@ class UIComponents:
                     logger.info(f"Загруженный файл {arxiv_id} найден: {pdf_link}")
                     
                     if not UIComponents._check_rag_ready(article, use_cache=False):
-                        logger.info(f"Запускаем RAG обработку для загруженного файла: {arxiv_id}")
+                        # Извлечение текста, чанкинг и эмбеддинги выполняются в фоновом
+                        # потоке, чтобы не блокировать перезапуск интерфейса
+                        task_id = async_processor.queue_uploaded_pdf(arxiv_id, pdf_link)
+                        logger.info(f"Загруженный файл {arxiv_id} поставлен в очередь обработки: {task_id}")
                         
-                        try:
-                            
-                            pdf_processor = PDFProcessor()
-                            extracted_data = pdf_processor.extract_text_pypdf2(pdf_link)
-                            
-                            if extracted_data and extracted_data.get('text'):
-                                text_content = extracted_data['text']
-                                logger.info(f"Текст извлечен: {len(text_content)} символов")
-                                
-                                chunker = TextChunker()
-                                
-                                chunk_data = {
-                                    'text': text_content,
-                                    'metadata': {
-                                        'arxiv_id': arxiv_id,
-                                        'pdf_path': pdf_link,
-                                        'source': 'uploaded_pdf'
-                                    }
-                                }
-                                
-                                chunks = chunker.chunk_text(chunk_data)
-                                
-                                if chunks:
-                                    logger.info(f"Создано {len(chunks)} чанков для {arxiv_id}")
-                                    
-                                    for chunk in chunks:
-                                        chunk['metadata']['arxiv_id'] = arxiv_id
-                                        chunk['metadata']['source'] = 'uploaded_pdf'
-                                        chunk['metadata']['file_path'] = pdf_link
-                                    
-                                    embedding_manager.add_to_index(chunks)
-                                    
-                                    logger.info(f"RAG обработка для {arxiv_id} завершена успешно")
-                                else:
-                                    logger.warning(f"Не удалось создать чанки для {arxiv_id}")
-                            else:
-                                logger.warning(f"Не удалось извлечь текст для RAG обработки: {arxiv_id}")
-                                
-                        except Exception as e:
-                            logger.error(f"Ошибка RAG обработки загруженного файла {arxiv_id}: {e}")
+                        if 'processing_tasks' not in st.session_state:
+                            st.session_state.processing_tasks = {}
+                        st.session_state.processing_tasks[arxiv_id] = task_id
                     else:
                         logger.info(f"RAG уже готов для загруженного файла: {arxiv_id}")
                     
@@ -459,19 +431,16 @@ class UIComponents:
             return st.session_state[cache_key]
         
         try:
-            chunks_for_article = [
-                chunk for chunk in embedding_manager.chunks_metadata 
-                if chunk.get('metadata', {}).get('arxiv_id') == arxiv_id
-            ]
+            chunks_count = len(embedding_manager.arxiv_to_chunk_ids.get(arxiv_id, ()))
             
-            if len(chunks_for_article) == 0:
+            if chunks_count == 0:
                 if use_cache:
                     st.session_state[cache_key] = False
                 return False
 
             index_exists = hasattr(embedding_manager, 'index') and embedding_manager.index is not None
             
-            rag_ready = len(chunks_for_article) > 0 and index_exists
+            rag_ready = chunks_count > 0 and index_exists
             
             if use_cache:
                 st.session_state[cache_key] = rag_ready
@@ -547,15 +516,7 @@ class UIComponents:
         
         if arxiv_id:
             # Простая проверка: есть ли чанки для этой статьи
-            try:
-                from paper_rag.embeddings import embedding_manager
-                chunks_for_article = [
-                    chunk for chunk in embedding_manager.chunks_metadata 
-                    if chunk.get('metadata', {}).get('arxiv_id') == arxiv_id
-                ]
-                rag_ready = len(chunks_for_article) > 0
-            except:
-                rag_ready = False
+            rag_ready = bool(embedding_manager.arxiv_to_chunk_ids.get(arxiv_id))
         
         
         # Простая логика активации
@@ -624,7 +585,7 @@ class UIComponents:
         try:
             
             # Получаем доступные модели
-            available_models = llm_factory.get_available_models()
+            available_models = _discover_llm_models()
             
             # Проверяем OpenAI API ключ
             openai_api_key = llm_config.get_openai_config().get('api_key') or os.getenv('OPENAI_API_KEY')
@@ -694,6 +655,8 @@ class UIComponents:
                         if api_key and api_key.startswith("sk-"):
                             # Сохраняем в конфигурации
                             llm_config.set_openai_api_key(api_key)
+                            # Список OpenAI моделей зависит от наличия ключа
+                            _discover_llm_models.clear()
                             st.success("✅ API ключ сохранен! Обновите страницу для применения.")
                             st.rerun()
                         else:
@@ -57,6 +57,10 @@ class DialogueManager:
         self.summary_block: Optional[str] = None
         self.total_chars = 0
         
+        # Собранный контекст диалога: новые сообщения дописываются в конец,
+        # полная пересборка нужна только после суммаризации и очистки
+        self._context_cache: Optional[str] = None
+        
     def add_message(self, role: str, content: str) -> None:
         """
         Добавление нового сообщения
@@ -69,6 +73,12 @@ class DialogueManager:
         self.messages.append(message)
         self.total_chars += message.char_count
         
+        # Дописываем сообщение к готовому контексту (первое сообщение добавляет заголовок)
+        if self._context_cache is not None and len(self.messages) > 1:
+            self._context_cache += "\n" + self._format_context_line(message)
+        else:
+            self._context_cache = None
+        
         # Проверяем необходимость суммаризации
         if self.total_chars > self.max_chars:
             self._summarize_old_messages()
@@ -95,6 +105,7 @@ class DialogueManager:
         
         # Удаляем суммаризированные сообщения
         self.messages = self.messages[half_index:]
+        self._context_cache = None
         
         # Пересчитываем общее количество символов
         self.total_chars = sum(msg.char_count for msg in self.messages)
@@ -122,10 +133,34 @@ class DialogueManager:
         
         return "\n".join(summary_parts)
     
+    def _format_context_line(self, message: DialogueMessage) -> str:
+        """
+        Форматирование сообщения для контекста диалога
+        
+        Args:
+            message: Сообщение диалога
+            
+        Returns:
+            Строка контекста
+        """
+        role_emoji = "🙋" if message.role == 'user' else "🤖"
+        return f"{role_emoji} **{message.role.title()}:** {message.content}"
+    
     def get_dialogue_context(self) -> str:
         """
         Получение контекста диалога для промпта
         
+        Returns:
+            Контекст диалога
+        """
+        if self._context_cache is None:
+            self._context_cache = self._build_dialogue_context()
+        return self._context_cache
+    
+    def _build_dialogue_context(self) -> str:
+        """
+        Полная сборка контекста диалога
+        
         Returns:
             Контекст диалога
         """
@@ -140,8 +175,7 @@ class DialogueManager:
         if self.messages:
             context_parts.append("**ТЕКУЩИЙ ДИАЛОГ:**")
             for message in self.messages:
-                role_emoji = "🙋" if message.role == 'user' else "🤖"
-                context_parts.append(f"{role_emoji} **{message.role.title()}:** {message.content}")
+                context_parts.append(self._format_context_line(message))
         
         return "\n".join(context_parts)
     
@@ -167,6 +201,7 @@ class DialogueManager:
         self.messages.clear()
         self.summary_block = None
         self.total_chars = 0
+        self._context_cache = None
         logger.info("Диалог очищен")
     
     def get_recent_messages(self, count: int = 5) -> List[DialogueMessage]:
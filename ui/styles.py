@@ -4,11 +4,10 @@
 
 import streamlit as st
 
-def apply_custom_styles():
-    """
-    Применяет кастомные CSS стили к приложению
-    """
-    st.markdown("""
+# Блок стилей собирается один раз при импорте модуля: Streamlit при каждом
+# перезапуске выполняет заново только главный скрипт, а импортированные
+# модули берутся из sys.modules
+_CUSTOM_STYLES_HTML = """
     <style>
         .stButton > button {
             border-radius: 5px;
@@ -68,7 +67,16 @@ def apply_custom_styles():
             padding: 2rem 1rem;
         }
     </style>
-    """, unsafe_allow_html=True)
+    """
+
+def apply_custom_styles():
+    """
+    Применяет кастомные CSS стили к приложению
+    
+    Вызывается на каждом перезапуске скрипта: без повторного st.markdown
+    стили пропадают со страницы после первого взаимодействия
+    """
+    st.markdown(_CUSTOM_STYLES_HTML, unsafe_allow_html=True)
 
 def get_article_card_style():
     """